@@ -0,0 +1,98 @@
+# background_loop.py
+#
+# One event loop for the whole process, running in a daemon thread, and one aiohttp session on
+# it. Qt threads and the CLI hand it coroutines (submit/run) instead of calling asyncio.run, so
+# every job shares the same connection pool: DNS lookups, TLS sessions and keep-alive
+# connections carry over from one download to the next. The shared browser lives here too.
+
+import atexit
+import asyncio
+import threading
+
+import aiohttp
+
+SESSION_LIMIT = 64  # connections across all hosts
+SESSION_LIMIT_PER_HOST = 8  # jobs cap themselves further with their own worker counts
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 60
+# No total timeout: large videos can take far longer than any fixed bound. Stalls still fail.
+SESSION_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=120)
+
+def new_event_loop() -> asyncio.AbstractEventLoop:
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.new_event_loop()
+    return uvloop.new_event_loop()
+
+class BackgroundLoop:
+    def __init__(self, name: str = "background-loop"):
+        self.loop = new_event_loop()
+        self.session = None
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        # Returns a concurrent.futures.Future, safe to wait on from any thread
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        if threading.current_thread() is self.thread:
+            coro.close()
+            raise RuntimeError("run() would block the background loop on itself; await the coroutine instead")
+        future = self.submit(coro)
+        try:
+            return future.result()
+        except BaseException:
+            # Ctrl+C in the CLI, for one, should stop the job rather than leave it running
+            future.cancel()
+            raise
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        # Only usable on the loop itself, so there is no await between the check and the assignment
+        if asyncio.get_running_loop() is not self.loop:
+            raise RuntimeError("the shared session belongs to the background loop; run this coroutine there")
+        if self.session is None or self.session.closed:
+            from utils import USER_AGENT  # utils itself imports this module
+            connector = aiohttp.TCPConnector(
+                limit=SESSION_LIMIT,
+                limit_per_host=SESSION_LIMIT_PER_HOST,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+            )
+            self.session = aiohttp.ClientSession(connector=connector, headers={"User-Agent": USER_AGENT}, timeout=SESSION_TIMEOUT)
+        return self.session
+
+    async def close_session(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+_background_loop = None
+_lock = threading.Lock()
+
+def get_background_loop() -> BackgroundLoop:
+    global _background_loop
+    with _lock:
+        if _background_loop is None:
+            _background_loop = BackgroundLoop()
+            atexit.register(_close_at_exit, _background_loop)
+        return _background_loop
+
+def _close_at_exit(background_loop: BackgroundLoop):
+    if background_loop.session is not None and background_loop.loop.is_running():
+        background_loop.submit(background_loop.close_session()).result(timeout=5)
+
+def submit_background(coro):
+    return get_background_loop().submit(coro)
+
+def run_in_background(coro):
+    return get_background_loop().run(coro)
+
+async def get_session() -> aiohttp.ClientSession:
+    # The process-wide session; per-request headers (Referer and the like) go on each request
+    return await get_background_loop().get_session()
@@ -0,0 +1,57 @@
+# benchmarks/bench_erome_parse.py
+#
+# Parse time and peak memory of each html_parsers backend over saved Erome album pages.
+# Backends whose optional package isn't installed are skipped. Fixtures are synthetic pages
+# with Erome's album markup (og:title, video sources, img.img-back tags).
+#
+#   python benchmarks/bench_erome_parse.py --runs 50
+#   python benchmarks/bench_erome_parse.py path/to/saved_album.html
+
+import sys
+import time
+import argparse
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from html_parsers import ALBUM_PARSERS, available_parsers
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+def measure(parser, html: str, runs: int) -> tuple[float, float, int]:
+    parser(html)  # warm-up: imports and selector compilation
+    started = time.perf_counter()
+    for _ in range(runs):
+        album = parser(html)
+    elapsed = (time.perf_counter() - started) / runs
+
+    # tracemalloc only sees Python allocations; C parsers' own buffers don't show up here
+    tracemalloc.start()
+    parser(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, len(album.videos) + len(album.images)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Erome album parsing backends")
+    parser.add_argument("files", nargs="*", type=Path)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    files = args.files or sorted(FIXTURES.glob("erome_album_*.html"))
+    backends = available_parsers()
+    skipped = [name for name in ALBUM_PARSERS if name not in backends]
+    if skipped:
+        print(f"Skipping (not installed): {', '.join(skipped)}")
+
+    for path in files:
+        html = path.read_text(encoding="utf-8")
+        print(f"\n{path.name} ({len(html) / 1024:.0f} KiB)")
+        baseline = None
+        for name in reversed(backends):  # slowest (full soup) first as the baseline
+            elapsed, peak, items = measure(ALBUM_PARSERS[name], html, args.runs)
+            baseline = baseline or elapsed
+            print(f"  {name:<11} {elapsed * 1000:8.2f} ms  {peak / 1024:8.0f} KiB peak  {items:4d} items  {baseline / elapsed:6.1f}x")
+
+if __name__ == "__main__":
+    main()
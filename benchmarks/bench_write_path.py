@@ -0,0 +1,102 @@
+# benchmarks/bench_write_path.py
+#
+# Compares the old 1 KB iter_chunked/aiofiles write loop against utils.write_stream.
+# A local aiohttp server runs in a child process so the CPU numbers only cover the client.
+#
+#   python benchmarks/bench_write_path.py --size-mb 512 --runs 3
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+import aiohttp
+import aiofiles
+from aiohttp import web
+from tqdm.asyncio import tqdm
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import write_stream
+
+HOST = "127.0.0.1"
+PORT = 8799
+SERVER_CHUNK = 64 * 1024
+
+def run_server(size: int):
+    block = os.urandom(SERVER_CHUNK)
+
+    async def handler(request):
+        response = web.StreamResponse(headers={"Content-Length": str(size)})
+        await response.prepare(request)
+        remaining = size
+        while remaining:
+            piece = block[:min(remaining, SERVER_CHUNK)]
+            await response.write(piece)
+            remaining -= len(piece)
+        return response
+
+    app = web.Application()
+    app.router.add_get("/blob", handler)
+    web.run_app(app, host=HOST, port=PORT, print=None)
+
+async def legacy_write(response: aiohttp.ClientResponse, path: Path, progress) -> int:
+    written = 0
+    async with aiofiles.open(path, "wb") as f:
+        async for chunk in response.content.iter_chunked(1024):
+            n = await f.write(chunk)
+            progress.update(n)
+            written += n
+    return written
+
+async def buffered_write(response: aiohttp.ClientResponse, path: Path, progress) -> int:
+    return await write_stream(response, path, progress)
+
+async def measure(name: str, writer, size: int, path: Path) -> tuple[float, float]:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"http://{HOST}:{PORT}/blob") as response:
+            progress = tqdm(total=size, unit="B", unit_scale=True, leave=False, disable=True)
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            written = await writer(response, path, progress)
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            progress.close()
+    if written != size:
+        raise RuntimeError(f"{name} wrote {written} bytes, expected {size}")
+    return wall, cpu
+
+async def wait_for_server():
+    for _ in range(100):
+        try:
+            _, writer = await asyncio.open_connection(HOST, PORT)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError("benchmark server did not start")
+
+async def main(size_mb: int, runs: int):
+    size = size_mb * 1024 * 1024
+    await wait_for_server()
+    print(f"{'writer':<10} {'run':>3} {'MB/s':>10} {'CPU s/GB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "blob.bin"
+        for name, writer in (("legacy", legacy_write), ("buffered", buffered_write)):
+            for run in range(1, runs + 1):
+                wall, cpu = await measure(name, writer, size, path)
+                print(f"{name:<10} {run:>3} {size_mb / wall:>10.1f} {cpu / (size / 1024 ** 3):>10.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the download write path")
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    server = multiprocessing.Process(target=run_server, args=(args.size_mb * 1024 * 1024,), daemon=True)
+    server.start()
+    try:
+        asyncio.run(main(args.size_mb, args.runs))
+    finally:
+        server.terminate()
@@ -0,0 +1,110 @@
+# blobstore.py
+
+import os
+import base64
+import shutil
+import hashlib
+from pathlib import Path
+
+BLOB_FOLDER = ".blobs"
+FICLONE = 0x40049409  # Linux ioctl for copy-on-write clones (btrfs, xfs, ...)
+
+class MultiHash:
+    # Feeds one stream into several digests, so a single pass over the data covers them all
+    def __init__(self, *algorithms: str):
+        self.hashers = {name: hashlib.new(name) for name in algorithms}
+
+    def update(self, data):
+        for hasher in self.hashers.values():
+            hasher.update(data)
+
+    def hexdigest(self, algorithm: str = "sha256") -> str:
+        return self.hashers[algorithm].hexdigest()
+
+def fourchan_md5_hex(md5_b64: str) -> str:
+    # 4chan's API reports MD5 digests base64-encoded
+    return base64.b64decode(md5_b64).hex()
+
+def reflink(src: Path, dest: Path):
+    import fcntl
+    with open(src, "rb") as s, open(dest, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            dest.unlink(missing_ok=True)
+            raise
+
+def link_file(src: Path, dest: Path):
+    # Hardlink where possible, then a reflink, and only copy as a last resort
+    if dest.exists():
+        if dest.samefile(src):
+            return
+        dest.unlink()
+    try:
+        os.link(src, dest)
+        return
+    except OSError:
+        pass
+    try:
+        reflink(src, dest)
+        return
+    except (OSError, ImportError):
+        pass
+    shutil.copy2(src, dest)
+
+def copy_tree(src: str, dest: str):
+    # shutil.copytree that keeps hardlinks: a blob and the per-source files linked to it are
+    # copied once, instead of once per link
+    copied = {}
+
+    def copy(src_file, dest_file):
+        stat = os.stat(src_file)
+        key = (stat.st_dev, stat.st_ino)
+        if stat.st_nlink > 1 and key in copied:
+            try:
+                os.link(copied[key], dest_file)
+                return dest_file
+            except OSError:
+                pass  # the destination can't link; fall through to a plain copy
+        shutil.copy2(src_file, dest_file)
+        copied[key] = dest_file
+        return dest_file
+
+    return shutil.copytree(src, dest, copy_function=copy)
+
+class BlobStore:
+    # Content-addressed store under <master>/.blobs; per-source folders hold links into it
+    def __init__(self, master_folder: str):
+        self.root = Path(master_folder) / BLOB_FOLDER
+
+    def blob_path(self, sha256: str) -> Path:
+        return self.root / "sha256" / sha256[:2] / sha256
+
+    def md5_alias_path(self, md5_hex: str) -> Path:
+        return self.root / "md5" / md5_hex[:2] / md5_hex
+
+    def find_md5(self, md5_hex: str) -> Path | None:
+        alias = self.md5_alias_path(md5_hex)
+        try:
+            blob = self.blob_path(alias.read_text().strip())
+        except OSError:
+            return None
+        return blob if blob.exists() else None
+
+    def ingest(self, file_path: Path, sha256: str, md5_hex: str | None = None) -> Path:
+        blob = self.blob_path(sha256)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        if blob.exists():
+            file_path.unlink()
+        else:
+            os.replace(file_path, blob)
+        if md5_hex:
+            alias = self.md5_alias_path(md5_hex)
+            alias.parent.mkdir(parents=True, exist_ok=True)
+            alias.write_text(sha256)
+        link_file(blob, file_path)
+        return blob
+
+    def link_into(self, blob: Path, file_path: Path):
+        link_file(blob, file_path)
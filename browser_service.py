@@ -0,0 +1,136 @@
+# browser_service.py
+#
+# A Chromium instance shared by every Playwright scraper in the process. It is launched on first
+# use, each job gets its own isolated context, contexts are replaced after a number of pages to
+# cap memory, and the browser is closed after it has sat idle for a while. The service belongs
+# to the background loop: run scraper coroutines there (background_loop.get_background_loop()).
+
+import asyncio
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+
+PAGES_PER_CONTEXT = 100
+IDLE_TIMEOUT = 120
+
+class BrowserJob:
+    # One job's view of the browser. Pages come from the current context; after pages_per_context
+    # pages a fresh context takes over and the old one closes once its last page is done.
+    def __init__(self, browser, pages_per_context: int, setup=None, context_options=None):
+        self.browser = browser
+        self.pages_per_context = pages_per_context
+        self.setup = setup
+        self.context_options = context_options or {}
+        self.context = None
+        self.context_pages = 0
+        self.open_pages = {}  # context -> pages currently open in it
+        self._lock = asyncio.Lock()
+
+    async def _current_context(self):
+        async with self._lock:
+            if self.context is None or self.context_pages >= self.pages_per_context:
+                previous = self.context
+                self.context = await self.browser.new_context(**self.context_options)
+                self.open_pages[self.context] = 0
+                self.context_pages = 0
+                if self.setup:
+                    await self.setup(self.context)
+                if previous is not None and not self.open_pages[previous]:
+                    await self._close_context(previous)
+            self.context_pages += 1
+            self.open_pages[self.context] += 1
+            return self.context
+
+    async def _close_context(self, context):
+        del self.open_pages[context]
+        try:
+            await context.close()
+        except Exception:
+            pass  # the browser may already be gone
+
+    @asynccontextmanager
+    async def page(self):
+        context = await self._current_context()
+        try:
+            page = await context.new_page()
+            try:
+                yield page
+            finally:
+                await page.close()
+        finally:
+            self.open_pages[context] -= 1
+            if context is not self.context and not self.open_pages[context]:
+                await self._close_context(context)
+
+    async def close(self):
+        for context in list(self.open_pages):
+            await self._close_context(context)
+        self.context = None
+
+class BrowserService:
+    def __init__(self, pages_per_context: int = PAGES_PER_CONTEXT, idle_timeout: float = IDLE_TIMEOUT, **launch_options):
+        self.pages_per_context = pages_per_context
+        self.idle_timeout = idle_timeout
+        self.launch_options = {"headless": True, **launch_options}
+        self.launches = 0
+        self._playwright = None
+        self._browser = None
+        self._jobs = 0
+        self._idle_handle = None
+        self._loop = None
+        self._lock = asyncio.Lock()
+
+    async def _get_browser(self):
+        async with self._lock:
+            if self._browser is None or not self._browser.is_connected():
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(**self.launch_options)
+                self.launches += 1
+            return self._browser
+
+    @asynccontextmanager
+    async def job(self, setup=None, **context_options):
+        loop = asyncio.get_running_loop()
+        if self._loop is None:
+            self._loop = loop
+        elif self._loop is not loop:
+            raise RuntimeError("BrowserService is bound to another event loop; run scrapers on the background loop")
+
+        self._jobs += 1
+        if self._idle_handle:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+        try:
+            job = BrowserJob(await self._get_browser(), self.pages_per_context, setup, context_options)
+            try:
+                yield job
+            finally:
+                await job.close()
+        finally:
+            self._jobs -= 1
+            if not self._jobs:
+                self._idle_handle = loop.call_later(self.idle_timeout, lambda: loop.create_task(self._close_if_idle()))
+
+    async def _close_if_idle(self):
+        if not self._jobs:
+            await self.shutdown()
+
+    async def shutdown(self):
+        async with self._lock:
+            if self._browser is not None:
+                try:
+                    await self._browser.close()
+                except Exception:
+                    pass
+                self._browser = None
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+_browser_service = None
+
+def get_browser_service() -> BrowserService:
+    global _browser_service
+    if _browser_service is None:
+        _browser_service = BrowserService()
+    return _browser_service
@@ -0,0 +1,213 @@
+# download_index.py
+
+import os
+import glob
+import time
+import queue
+import sqlite3
+import threading
+
+INDEX_NAME = "downloads.sqlite3"
+LINK_LOG_FILE = "downloaded_links.log"
+MIGRATE_BATCH_SIZE = 1000
+QUERY_BATCH_SIZE = 500  # stays under SQLite's bound-parameter limit
+WRITER_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    path TEXT,
+    downloaded_at REAL NOT NULL,
+    PRIMARY KEY (source, url)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS watermarks (
+    source TEXT NOT NULL,
+    listing TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (source, listing)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS subreddit_meta (
+    name TEXT PRIMARY KEY,
+    display_name TEXT,
+    title TEXT,
+    subscribers INTEGER,
+    over18 INTEGER,
+    fetched_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS links (
+    source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    logged_at REAL NOT NULL,
+    PRIMARY KEY (source, url)
+) WITHOUT ROWID;
+"""
+
+class DownloadIndex:
+    # One SQLite store (WAL mode) for per-source download dedup and the downloaded-links log.
+    # Connections are shared with worker threads, so every statement runs under a lock.
+    def __init__(self, cache_folder: str = "cache", link_log_file: str | None = LINK_LOG_FILE):
+        os.makedirs(cache_folder, exist_ok=True)
+        self.cache_folder = cache_folder
+        self.path = os.path.join(cache_folder, INDEX_NAME)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.migrate_legacy(link_log_file)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    # --- Downloads ---
+    def contains(self, source: str, url: str) -> bool:
+        with self._lock:
+            row = self.conn.execute("SELECT 1 FROM downloads WHERE source = ? AND url = ?", (source, url)).fetchone()
+        return row is not None
+
+    def add(self, source: str, url: str, path: str | None = None):
+        self.add_many(source, [(url, path)])
+
+    def add_many(self, source: str, entries):
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO downloads (source, url, path, downloaded_at) VALUES (?, ?, ?, ?)",
+                ((source, url, path, now) for url, path in entries)
+            )
+
+    def clear_source(self, source: str) -> int:
+        # A cleared cache means "download again", so the sync watermark has to go too
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM watermarks WHERE source = ?", (source,))
+            return self.conn.execute("DELETE FROM downloads WHERE source = ?", (source,)).rowcount
+
+    def clear_downloads(self) -> int:
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM watermarks")
+            return self.conn.execute("DELETE FROM downloads").rowcount
+
+    # --- Sync watermarks: newest post processed per subreddit and listing ---
+    def get_watermark(self, source: str, listing: str) -> tuple[str, float] | None:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT post_id, created FROM watermarks WHERE source = ? AND listing = ?", (source, listing)
+            ).fetchone()
+
+    def set_watermark(self, source: str, listing: str, post_id: str, created: float):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO watermarks (source, listing, post_id, created, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (source, listing, post_id, created, time.time())
+            )
+
+    # --- Subreddit metadata cache; subscribers is NULL for names Reddit did not return ---
+    def get_subreddit_meta(self, names: list[str], max_age: float) -> dict[str, dict]:
+        cutoff = time.time() - max_age
+        found = {}
+        with self._lock:
+            for start in range(0, len(names), QUERY_BATCH_SIZE):
+                batch = names[start:start + QUERY_BATCH_SIZE]
+                rows = self.conn.execute(
+                    f"SELECT name, display_name, title, subscribers, over18 FROM subreddit_meta "
+                    f"WHERE fetched_at >= ? AND name IN ({','.join('?' * len(batch))})",
+                    (cutoff, *batch)
+                )
+                for name, display_name, title, subscribers, over18 in rows:
+                    found[name] = {"name": display_name, "title": title, "subscribers": subscribers, "over18": bool(over18)}
+        return found
+
+    def put_subreddit_meta(self, entries: dict[str, dict | None]):
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO subreddit_meta (name, display_name, title, subscribers, over18, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (name, meta["name"], meta["title"], meta["subscribers"], int(meta["over18"]), now) if meta
+                    else (name, name, None, None, 0, now)
+                    for name, meta in entries.items()
+                )
+            )
+
+    # --- Link log ---
+    def log_link(self, source: str, url: str) -> bool:
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO links (source, url, logged_at) VALUES (?, ?, ?)",
+                (source.upper(), url, time.time())
+            )
+        return cursor.rowcount > 0
+
+    def links(self) -> list[tuple[str, str]]:
+        with self._lock:
+            return self.conn.execute("SELECT source, url FROM links ORDER BY logged_at").fetchall()
+
+    # --- One-time import of cache/r_<name>.txt files and downloaded_links.log ---
+    def migrate_legacy(self, link_log_file: str | None = None):
+        for cache_file in glob.glob(os.path.join(self.cache_folder, "r_*.txt")):
+            source = os.path.splitext(os.path.basename(cache_file))[0]
+            with open(cache_file, "r") as f:
+                urls = [line.strip() for line in f if line.strip()]
+            for start in range(0, len(urls), MIGRATE_BATCH_SIZE):
+                self.add_many(source, ((url, None) for url in urls[start:start + MIGRATE_BATCH_SIZE]))
+            os.replace(cache_file, cache_file + ".migrated")
+
+        if link_log_file and os.path.exists(link_log_file):
+            entries = []
+            now = time.time()
+            with open(link_log_file, "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if line.startswith("[") and "] " in line:
+                        source, url = line[1:].split("] ", 1)
+                        # Keep the file's order when listing links later
+                        entries.append((source.upper(), url, now + len(entries) * 1e-6))
+            with self._lock, self.conn:
+                self.conn.executemany("INSERT OR IGNORE INTO links (source, url, logged_at) VALUES (?, ?, ?)", entries)
+            os.replace(link_log_file, link_log_file + ".migrated")
+
+class IndexWriter:
+    # Takes download records from callbacks on the event loop and commits them from one
+    # worker thread, so a slow SQLite write never stalls the other downloads.
+    # close() waits until everything added so far is written.
+    def __init__(self, index: DownloadIndex):
+        self.index = index
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="index-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, source: str, url: str, path: str | None = None):
+        self._queue.put((source, url, path))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self):
+        closing = False
+        while not closing:
+            # Block for the first record, then take whatever else is waiting as one transaction
+            batch = [self._queue.get()]
+            while len(batch) < WRITER_BATCH_SIZE and not self._queue.empty():
+                batch.append(self._queue.get())
+            if batch[-1] is None:
+                closing = True
+                batch.pop()
+            by_source = {}
+            for source, url, path in batch:
+                by_source.setdefault(source, []).append((url, path))
+            for source, entries in by_source.items():
+                try:
+                    self.index.add_many(source, entries)
+                except Exception as e:
+                    print(f"[ERROR] Failed to record {len(entries)} downloads for {source}: {e!r}")
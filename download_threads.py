@@ -1,24 +1,22 @@
 import os
-from bs4 import BeautifulSoup
-import re
 import asyncio
-import aiohttp
-import aiofiles
-from pathlib import Path
 from PyQt5.QtCore import QThread, pyqtSignal
-import requests
 from praw import Reddit
-import cloudscraper
-from utils import create_download_path, download_file, scrape_erome_album
-from utils import parse_4chan_thread_url, fetch_4chan_thread_data, get_4chan_media_url
-from utils import scrape_motherless_gallery, create_download_path
+from extractors import Extractor, download_media_item
+from scheduler import DownloadScheduler
+from manifest import DownloadManifest
+from blobstore import BlobStore
+from reddit_utils import is_image_url, download_reddit_images, subreddit_source, iter_posts, lookup_subreddits, MAX_CONNECTIONS, LISTING_LIMIT
+from download_index import DownloadIndex, IndexWriter
+from background_loop import get_background_loop, get_session
+from phash_index import PHashIndex, NearDuplicate, phash_available
 
 # Reddit Downloader
 class DownloaderThread(QThread):
     progress_updated = pyqtSignal(int, int)
     log_message = pyqtSignal(str)
 
-    def __init__(self, subreddit_name, limit, allow_sfw, allow_nsfw, master_folder, cache_folder, reddit_client: Reddit):
+    def __init__(self, subreddit_name, limit, allow_sfw, allow_nsfw, master_folder, cache_folder, reddit_client: Reddit, max_connections=MAX_CONNECTIONS, near_duplicates=None):
         super().__init__()
         self.subreddit_name = subreddit_name
         self.limit = limit
@@ -27,6 +25,8 @@ class DownloaderThread(QThread):
         self.master_folder = master_folder
         self.cache_folder = cache_folder
         self.reddit = reddit_client
+        self.max_connections = max_connections
+        self.near_duplicates = near_duplicates  # None, "flag" or "skip"
 
     def run(self):
         try:
@@ -38,48 +38,60 @@ class DownloaderThread(QThread):
                 return
 
             os.makedirs(self.master_folder, exist_ok=True)
-            os.makedirs(self.cache_folder, exist_ok=True)
 
-            safe_name = re.sub(r'[^\w-]', '_', self.subreddit_name.lower().replace("r/", ""))
-            subfolder_name = f"r_{safe_name}"
+            subfolder_name = subreddit_source(self.subreddit_name)
             download_folder = os.path.join(self.master_folder, subfolder_name)
             os.makedirs(download_folder, exist_ok=True)
-
-            cache_file = os.path.join(self.cache_folder, f"{subfolder_name}.txt")
-            if os.path.exists(cache_file):
-                with open(cache_file, "r") as f:
-                    cached_urls = set(line.strip() for line in f if line.strip())
-            else:
-                cached_urls = set()
-
-            posts = list(subreddit.hot(limit=1000))
-            count = 0
-            new_urls = []
-            total_target = len(posts) if not self.limit else self.limit
-            self.progress_updated.emit(0, total_target)
-
-            for post in posts:
-                url = post.url.strip()
-                if url.lower().endswith((".jpg", ".jpeg", ".png", ".gif")) and url not in cached_urls:
-                    try:
-                        image_data = requests.get(url).content
-                        extension = os.path.splitext(url)[1]
-                        filename = os.path.join(download_folder, f"{subfolder_name}_{count}_{post.id}{extension}")
-                        with open(filename, "wb") as f:
-                            f.write(image_data)
-                        self.log(f"Saved: {filename}")
-                        count += 1
-                        new_urls.append(url)
-                        self.progress_updated.emit(count, total_target)
-                        if self.limit and count >= self.limit:
-                            break
-                    except Exception as e:
-                        self.log(f"Failed to download {url}: {e}")
-
-            if new_urls:
-                with open(cache_file, "a") as f:
-                    for url in new_urls:
-                        f.write(url + "\n")
+            index = DownloadIndex(self.cache_folder)
+            writer = IndexWriter(index)
+
+            found = 0
+            self.progress_updated.emit(0, self.limit or 0)
+
+            # Posts stream in page by page; downloading starts with the first page
+            async def candidates():
+                nonlocal found
+                async for post in iter_posts(subreddit.hot(limit=LISTING_LIMIT)):
+                    if is_image_url(post.url) and not await asyncio.to_thread(index.contains, subfolder_name, post.url):
+                        found += 1
+                        yield post
+
+            def on_saved(filename, url, count):
+                writer.add(subfolder_name, url, filename)
+                self.log(f"Saved: {filename}")
+                self.progress_updated.emit(count, self.limit or found)
+
+            def on_error(url, error):
+                if isinstance(error, NearDuplicate):
+                    # Remember it so the same repost isn't fetched again next run
+                    writer.add(subfolder_name, url)
+                    self.log(f"Skipped {url}: {error}")
+                else:
+                    self.log(f"Failed to download {url}: {error}")
+
+            def on_near_duplicate(url, filename, match_path, distance):
+                self.log(f"Near-duplicate: {filename} ~ {match_path} (distance {distance})")
+
+            phash_index = None
+            if self.near_duplicates:
+                if phash_available():
+                    phash_index = PHashIndex(self.cache_folder)
+                else:
+                    self.log("Pillow is not installed; near-duplicate detection is off.")
+
+            try:
+                new_urls = get_background_loop().run(download_reddit_images(
+                    candidates(), download_folder, subfolder_name, self.limit,
+                    max_connections=self.max_connections, on_saved=on_saved, on_error=on_error,
+                    blob_store=BlobStore(self.master_folder), phash_index=phash_index,
+                    skip_near_duplicates=self.near_duplicates == "skip", on_near_duplicate=on_near_duplicate
+                ))
+            finally:
+                writer.close()
+                index.close()
+                if phash_index:
+                    phash_index.close()
+            count = len(new_urls)
 
             if count == 0:
                 self.log("No new images found (all duplicates).")
@@ -92,117 +104,129 @@ class DownloaderThread(QThread):
     def log(self, message):
         self.log_message.emit(message)
 
-# 4chan Downloader
-class Download4chanThread(QThread):
-    progress_updated = pyqtSignal(int, int)
+# Subreddit search; results are emitted one by one as the listing pages arrive
+class SubredditSearchThread(QThread):
+    result_found = pyqtSignal(int, tuple)
+    search_finished = pyqtSignal(int, object, list)
     log_message = pyqtSignal(str)
 
-    def __init__(self, url, master_folder, log_link_callback=None):
+    def __init__(self, generation, key, reddit_client: Reddit, limit=100, nsfw_names=None, cache_folder=None):
         super().__init__()
-        self.url = url
-        self.master_folder = master_folder
-        self.log_link_callback = log_link_callback
+        self.generation = generation
+        self.key = key
+        self.reddit = reddit_client
+        self.limit = limit
+        self.nsfw_names = nsfw_names  # NameIndex of known NSFW subreddits, searched when NSFW is allowed
+        self.cache_folder = cache_folder
 
     def run(self):
-        asyncio.run(self.download_4chan_thread())
-
-    async def download_4chan_thread(self):
-        try:
-            board, thread_id = parse_4chan_thread_url(self.url)
-            data = await fetch_4chan_thread_data(board, thread_id)
-
-            save_path = Path(self.master_folder) / f"4chan_{board}_{thread_id}"
-            save_path.mkdir(parents=True, exist_ok=True)
-
-            images = [post for post in data.get("posts", []) if "tim" in post and "ext" in post]
-            total = len(images)
+        keyword, search_type, allow_sfw, allow_nsfw = self.key
+        results = []
+        seen = set()
 
-            async with aiohttp.ClientSession() as session:
-                for i, post in enumerate(images):
-                    file_url = get_4chan_media_url(board, post["tim"], post["ext"])
-                    file_path = save_path / f"{post['tim']}{post['ext']}"
-                    async with session.get(file_url) as resp:
-                        if resp.status == 200:
-                            with open(file_path, "wb") as out:
-                                out.write(await resp.read())
-                            self.log_message.emit(f"Saved: {file_path}")
-                            if self.log_link_callback:
-                                self.log_link_callback("4chan", self.url)  # Thread URL only
-                        else:
-                            self.log_message.emit(f"Failed to download: {file_url}")
-
-                    self.progress_updated.emit(i + 1, total)
-
-            self.log_message.emit(f"Downloaded {total} images to {save_path}")
-
-        except Exception as e:
-            self.log_message.emit(f"4chan download error: {e}")
+        def add(name, title, subscribers, over18):
+            result = (name, title, subscribers, over18)
+            seen.add(name.lower())
+            results.append(result)
+            self.result_found.emit(self.generation, result)
 
-    # Erome downloader          
-class DownloadEromeThread(QThread):
-    progress_updated = pyqtSignal(int, int)
-    log_message = pyqtSignal(str)
-
-    def __init__(self, url, master_folder, collect_album_data_fn, download_fn):
-        super().__init__()
-        self.url = url
-        self.master_folder = master_folder
-        self.collect_album_data_fn = collect_album_data_fn
-        self.download_fn = download_fn
-
-    def run(self):
-        asyncio.run(self.download_erome())
-
-    async def download_erome(self):
         try:
-            title, urls = await scrape_erome_album(self.url, skip_videos=False, skip_images=False)
-            download_path = create_download_path(self.master_folder, title)
-
-            total = len(urls)
-            semaphore = asyncio.Semaphore(1)
-
-            async with aiohttp.ClientSession(headers={"Referer": self.url}) as session:
-                for i, url in enumerate(urls):
-                    await download_file(session, url, semaphore, download_path)
-                    self.progress_updated.emit(i + 1, total)
-
-            self.log_message.emit(f"Erome gallery downloaded to {download_path}")
-
+            for subreddit in self.reddit.subreddits.search(keyword, limit=self.limit):
+                if subreddit.subscribers is None:
+                    continue
+                if subreddit.over18 and not allow_nsfw:
+                    continue
+                if not subreddit.over18 and not allow_sfw:
+                    continue
+                if search_type == "Search by subreddit name" and keyword not in subreddit.display_name.lower():
+                    continue
+                add(subreddit.display_name, subreddit.title, subreddit.subscribers, subreddit.over18)
+
+            # Known NSFW names Reddit's search missed, resolved in batches through the metadata cache
+            if allow_nsfw and self.nsfw_names is not None:
+                matches = [name for name in self.nsfw_names.search(keyword) if name not in seen][:self.limit]
+                if matches:
+                    index = DownloadIndex(self.cache_folder) if self.cache_folder else None
+                    try:
+                        metadata = lookup_subreddits(self.reddit, matches, index)
+                    finally:
+                        if index:
+                            index.close()
+                    for name in matches:
+                        meta = metadata.get(name)
+                        if meta and meta["over18"]:
+                            add(meta["name"], meta["title"], meta["subscribers"], meta["over18"])
         except Exception as e:
-            self.log_message.emit(f"Erome download error: {e}")
+            self.log_message.emit(f"Error searching subreddits: {e}")
+            return
+        self.search_finished.emit(self.generation, self.key, results)
 
-class DownloadMotherlessThread(QThread):
+# Gallery/thread downloads for every site in the extractor registry
+class MediaDownloadThread(QThread):
     progress_updated = pyqtSignal(int, int)
     log_message = pyqtSignal(str)
+    link_downloaded = pyqtSignal(str, str)
 
-    def __init__(self, url, master_folder, scrape_fn, log_link_callback=None):
+    def __init__(self, url, master_folder, extractor: Extractor, max_connections=None, log_link_callback=None):
         super().__init__()
         self.url = url
         self.master_folder = master_folder
-        self.scrape_fn = scrape_fn
-        self.log_link_callback = log_link_callback
+        self.extractor = extractor
+        self.max_connections = max_connections or extractor.max_connections
+        if log_link_callback:
+            # The job finishes on the background loop; the signal hands the callback to the owner's thread
+            self.link_downloaded.connect(log_link_callback)
 
     def run(self):
-        asyncio.run(self.download_gallery())
+        # On the background loop, where the shared session and browser live
+        get_background_loop().run(self.download())
 
-    async def download_motherless(self):
+    async def download(self):
         try:
-            title, media_urls = await self.scrape_fn(self.url)
-            if not media_urls:
-                self.log_message.emit("No media found in Motherless page.")
+            # The process-wide session; this job's connections are capped by its worker count
+            session = await get_session()
+            extraction = await self.extractor.extract(session, self.url, self.master_folder, self.log_message.emit)
+            found = 0
+            completed = 0
+
+            # Progress follows completion order; the total grows while a streaming
+            # extractor is still finding items
+            def report():
+                self.progress_updated.emit(completed, max(found, extraction.total or 0))
+
+            def on_done(item, file_path):
+                nonlocal completed
+                completed += 1
+                report()
+
+            def on_error(item, error):
+                nonlocal completed
+                completed += 1
+                self.log_message.emit(f"Failed to download {item.url}: {error}")
+                report()
+
+            manifest = DownloadManifest(extraction.path)
+            blob_store = BlobStore(self.master_folder)
+            semaphore = asyncio.Semaphore(self.max_connections)
+            handler = lambda item: download_media_item(session, item, semaphore, extraction.path, manifest, blob_store)
+            try:
+                async with DownloadScheduler(handler, self.max_connections, on_done, on_error) as scheduler:
+                    report()
+                    async for item in extraction.items:
+                        found += 1
+                        await scheduler.submit(item)
+            finally:
+                await asyncio.to_thread(manifest.save)
+
+            if not found:
+                self.log_message.emit(f"No media found in {self.extractor.label}.")
                 return
-
-            download_path = create_download_path(self.master_folder, title)
-            semaphore = asyncio.Semaphore(3)  # control concurrency
-
-            async with aiohttp.ClientSession() as session:
-                for i, url in enumerate(media_urls):
-                    await download_file(session, url, semaphore, download_path)
-                    self.progress_updated.emit(i + 1, len(media_urls))
-
-            self.log_message.emit(f"Downloaded {len(media_urls)} items to {download_path}")
-            if self.log_link_callback:
-                self.log_link_callback("motherless", self.url)
+            if scheduler.done:
+                self.link_downloaded.emit(self.extractor.name, self.url)
+            if scheduler.failed:
+                self.log_message.emit(f"Downloaded {scheduler.done} of {found} files to {extraction.path}, {scheduler.failed} failed")
+            else:
+                self.log_message.emit(f"Downloaded {found} files to {extraction.path}")
 
         except Exception as e:
-            self.log_message.emit(f"Motherless download error: {e}")
\ No newline at end of file
+            self.log_message.emit(f"{self.extractor.label} download error: {e}")
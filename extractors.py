@@ -0,0 +1,143 @@
+# extractors.py
+#
+# Site handlers behind one interface. An extractor makes the one request it needs to name the
+# download folder, then hands back an async generator of MediaItems, so downloads start on the
+# first item while the rest of the gallery is still being crawled. Extractors register by
+# hostname; find_extractor maps a pasted URL to one.
+
+import asyncio
+from pathlib import Path
+from dataclasses import dataclass
+from typing import AsyncIterator
+from urllib.parse import urlparse
+
+import aiohttp
+
+from blobstore import BlobStore, fourchan_md5_hex
+from manifest import DownloadManifest
+from html_parsers import parse_album
+from utils import (
+    EROME_CONNECTIONS, MOTHERLESS_CACHE_NAME, clean_album_title, create_download_path, download_file,
+    fetch_text, parse_4chan_thread_url, fetch_4chan_thread_data, get_4chan_media_url, motherless_folder_name,
+    iter_motherless_urls,
+)
+
+@dataclass(frozen=True, slots=True)
+class MediaItem:
+    url: str
+    filename: str | None = None  # defaults to the last path segment of url
+    size: int | None = None
+    md5: str | None = None  # hex digest
+    headers: dict | None = None  # sent with this item's requests only
+
+@dataclass(slots=True)
+class Extraction:
+    path: Path
+    items: AsyncIterator[MediaItem]
+    total: int | None = None  # known up front for single-page sources
+
+class Extractor:
+    name = ""  # label for the link log
+    label = ""  # shown as the detected type in the GUI
+    hosts: tuple[str, ...] = ()
+    max_connections = 4
+
+    async def extract(self, session: aiohttp.ClientSession, url: str, master_folder: str, log=print) -> Extraction:
+        raise NotImplementedError
+
+EXTRACTORS: dict[str, Extractor] = {}
+
+def register(cls):
+    extractor = cls()
+    for host in cls.hosts:
+        EXTRACTORS[host] = extractor
+    return cls
+
+def find_extractor(url: str) -> Extractor | None:
+    # Matches the host and then each parent domain, so boards.4chan.org finds 4chan.org
+    host = urlparse(url if "://" in url else f"https://{url}").hostname or ""
+    parts = host.lower().split(".")
+    for i in range(len(parts) - 1):
+        extractor = EXTRACTORS.get(".".join(parts[i:]))
+        if extractor:
+            return extractor
+    return None
+
+async def iter_items(items):
+    for item in items:
+        yield item
+
+async def download_media_item(session: aiohttp.ClientSession, item: MediaItem, semaphore: asyncio.Semaphore, download_path: Path,
+                              manifest: DownloadManifest | None = None, blob_store: BlobStore | None = None) -> Path:
+    file_path = download_path / (item.filename or Path(urlparse(item.url).path).name)
+    if manifest is not None and manifest.is_complete(item.url, file_path):
+        return file_path
+    # A known MD5 means a repost we already hold costs no transfer at all
+    blob = blob_store.find_md5(item.md5) if blob_store is not None and item.md5 else None
+    if blob:
+        await asyncio.to_thread(blob_store.link_into, blob, file_path)
+        if manifest is not None:
+            await asyncio.to_thread(manifest.record, item.url, file_path, sha256=blob.name)
+        return file_path
+    return await download_file(
+        session, item.url, semaphore, download_path, manifest=manifest, blob_store=blob_store,
+        file_name=item.filename, request_headers=item.headers, expected_size=item.size, md5_hex=item.md5
+    )
+
+@register
+class EromeExtractor(Extractor):
+    name = "EROME"
+    label = "Erome Gallery"
+    hosts = ("erome.com",)
+    max_connections = EROME_CONNECTIONS
+
+    async def extract(self, session, url, master_folder, log=print):
+        album = parse_album(await fetch_text(session, url))
+        path = create_download_path(master_folder, clean_album_title(album.title or ""))
+        urls = list(dict.fromkeys(album.videos + album.images))
+        # Erome's CDN wants the album page as the referrer
+        items = [MediaItem(media_url, headers={"Referer": url}) for media_url in urls]
+        return Extraction(path, iter_items(items), len(items))
+
+@register
+class FourChanExtractor(Extractor):
+    name = "4chan"
+    label = "4chan Thread"
+    hosts = ("4chan.org",)
+    max_connections = 8
+
+    async def extract(self, session, url, master_folder, log=print):
+        board, thread_id = parse_4chan_thread_url(url)
+        data = await fetch_4chan_thread_data(board, thread_id, session)
+        path = create_download_path(master_folder, f"4chan_{board}_{thread_id}")
+        items = [
+            MediaItem(
+                get_4chan_media_url(board, post["tim"], post["ext"]),
+                filename=f"{post['tim']}{post['ext']}",
+                size=post.get("fsize"),
+                md5=fourchan_md5_hex(post["md5"]) if post.get("md5") else None,
+            )
+            for post in data.get("posts", []) if "tim" in post and "ext" in post
+        ]
+        return Extraction(path, iter_items(items), len(items))
+
+@register
+class MotherlessExtractor(Extractor):
+    name = "MOTHERLESS"
+    label = "Motherless Gallery"
+    hosts = ("motherless.com",)
+    max_connections = 3
+
+    async def extract(self, session, url, master_folder, log=print):
+        # Nothing to fetch up front: the folder comes from the URL and media streams in as it resolves.
+        # The browser fallback needs the shared background loop.
+        path = create_download_path(master_folder, motherless_folder_name(url))
+
+        def on_resolved(method, count, seconds):
+            log(f"Resolved {count} media URLs via {method} in {seconds:.1f}s")
+
+        async def items():
+            async for media_url in iter_motherless_urls(session, url, path / MOTHERLESS_CACHE_NAME, on_resolved):
+                yield MediaItem(media_url)
+
+        return Extraction(path, items())
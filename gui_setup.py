@@ -2,8 +2,9 @@
 from PyQt5.QtWidgets import (
     QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout, QLineEdit,
     QTextEdit, QMessageBox, QCheckBox, QListWidget, QComboBox, QFileDialog,
-    QMenu, QAction, QProgressBar
+    QMenu, QAction, QProgressBar, QCompleter
 )
+from PyQt5.QtCore import QStringListModel
 import webbrowser
 
 def setup_gui(main_window):
@@ -26,8 +27,13 @@ def setup_gui(main_window):
     main_window.count_label = QLabel("Number of Images:")
     main_window.count_input = QComboBox()
     main_window.count_input.addItems(["5", "10", "20", "50", "100", "200", "All"])
+    main_window.near_dup_label = QLabel("Near-duplicates:")
+    main_window.near_dup_combo = QComboBox()
+    main_window.near_dup_combo.addItems(["Keep", "Flag", "Skip"])
     count_layout.addWidget(main_window.count_label)
     count_layout.addWidget(main_window.count_input)
+    count_layout.addWidget(main_window.near_dup_label)
+    count_layout.addWidget(main_window.near_dup_combo)
     main_window.count_container.hide()
 
     # Filter checkboxes
@@ -48,6 +54,10 @@ def setup_gui(main_window):
     main_window.search_type_combo = QComboBox()
     main_window.search_type_combo.addItems(["Search by keyword", "Search by subreddit name"])
     main_window.keyword_input = QLineEdit()
+    # Filled as the user types from the known NSFW name index; shown as-is, not re-filtered by Qt
+    main_window.keyword_completer = QCompleter(QStringListModel(), main_window.keyword_input)
+    main_window.keyword_completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+    main_window.keyword_input.setCompleter(main_window.keyword_completer)
     main_window.search_button = QPushButton("Search")
     search_layout.addWidget(main_window.search_type_combo)
     search_layout.addWidget(main_window.keyword_input)
@@ -0,0 +1,81 @@
+# html_parsers.py
+#
+# Extracts what the Erome scraper needs from an album page: the og:title and the video/image
+# URLs. Backends are tried fastest first; selectolax and lxml are optional C-backed parsers,
+# and the bs4 fallback only builds the meta/source/img tags instead of the whole tree.
+
+from dataclasses import dataclass, field
+from bs4 import BeautifulSoup, SoupStrainer
+
+@dataclass(slots=True)
+class AlbumPage:
+    title: str | None = None
+    videos: list[str] = field(default_factory=list)
+    images: list[str] = field(default_factory=list)
+
+def parse_album_selectolax(html: str) -> AlbumPage:
+    from selectolax.lexbor import LexborHTMLParser
+    tree = LexborHTMLParser(html)
+    meta = tree.css_first('meta[property="og:title"]')
+    return AlbumPage(
+        meta.attributes.get("content") if meta else None,
+        [node.attributes["src"] for node in tree.css("source[src]")],
+        [node.attributes["data-src"] for node in tree.css("img.img-back[data-src]")],
+    )
+
+def parse_album_lxml(html: str) -> AlbumPage:
+    import lxml.html
+    tree = lxml.html.fromstring(html)
+    titles = tree.xpath('//meta[@property="og:title"]/@content')
+    return AlbumPage(
+        titles[0] if titles else None,
+        [str(src) for src in tree.xpath("//source/@src")],
+        [str(src) for src in tree.xpath("//img[contains(concat(' ', normalize-space(@class), ' '), ' img-back ')]/@data-src")],
+    )
+
+ALBUM_TAGS = SoupStrainer(["meta", "source", "img"])
+
+def parse_album_strained(html: str) -> AlbumPage:
+    # Pure Python, but only the three tag types that matter become objects
+    soup = BeautifulSoup(html, "html.parser", parse_only=ALBUM_TAGS)
+    meta = soup.find("meta", property="og:title")
+    return AlbumPage(
+        meta.get("content") if meta else None,
+        [tag["src"] for tag in soup.find_all("source", src=True)],
+        [tag["data-src"] for tag in soup.find_all("img", attrs={"data-src": True}) if "img-back" in tag.get("class", [])],
+    )
+
+def parse_album_soup(html: str) -> AlbumPage:
+    # The original full-tree parse, kept as the baseline for benchmarks
+    soup = BeautifulSoup(html, "html.parser")
+    meta = soup.find("meta", property="og:title")
+    return AlbumPage(
+        meta.get("content") if meta else None,
+        [tag["src"] for tag in soup.find_all("source", src=True)],
+        [tag["data-src"] for tag in soup.find_all("img", class_="img-back") if tag.get("data-src")],
+    )
+
+ALBUM_PARSERS = {
+    "selectolax": parse_album_selectolax,
+    "lxml": parse_album_lxml,
+    "strainer": parse_album_strained,
+    "soup": parse_album_soup,
+}
+OPTIONAL_MODULES = {"selectolax": "selectolax.lexbor", "lxml": "lxml.html"}
+
+def available_parsers() -> list[str]:
+    names = []
+    for name in ALBUM_PARSERS:
+        module = OPTIONAL_MODULES.get(name)
+        if module:
+            try:
+                __import__(module)
+            except ImportError:
+                continue
+        names.append(name)
+    return names
+
+ALBUM_BACKEND = available_parsers()[0]
+
+def parse_album(html: str, backend: str | None = None) -> AlbumPage:
+    return ALBUM_PARSERS[backend or ALBUM_BACKEND](html)
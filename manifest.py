@@ -0,0 +1,105 @@
+# manifest.py
+
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+
+MANIFEST_NAME = ".manifest.json"
+JOURNAL_SUFFIX = ".journal"
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+def hash_file(path: Path, algorithm: str = "sha256", hasher=None):
+    hasher = hasher or hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            hasher.update(block)
+    return hasher
+
+class DownloadManifest:
+    # URL -> {file, size, etag, last_modified, sha256} for everything completed in one folder.
+    # Each record is one appended journal line, so the cost of recording doesn't grow with the
+    # folder; save() folds the journal into the JSON snapshot once, at the end of a job.
+    def __init__(self, folder: Path):
+        self.path = Path(folder) / MANIFEST_NAME
+        self.journal_path = self.path.with_name(self.path.name + JOURNAL_SUFFIX)
+        self.entries = {}
+        self._journal = None
+        self._unsaved = 0
+        self._lock = threading.Lock()  # records arrive from worker threads
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+        self._replay_journal()
+
+    def _replay_journal(self):
+        # Records from a run that ended without save(); a torn last line is skipped
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        url, entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[url] = entry
+                    self._unsaved += 1
+        except OSError:
+            pass
+
+    def get(self, url: str) -> dict | None:
+        return self.entries.get(url)
+
+    def is_complete(self, url: str, file_path: Path) -> bool:
+        entry = self.entries.get(url)
+        if not entry or entry.get("file") != file_path.name:
+            return False
+        try:
+            return file_path.stat().st_size == entry["size"]
+        except OSError:
+            return False
+
+    def conditional_headers(self, url: str) -> dict:
+        entry = self.entries.get(url) or {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def record(self, url: str, file_path: Path, response_headers=None, sha256: str | None = None):
+        response_headers = response_headers or {}
+        entry = {
+            "file": file_path.name,
+            "size": file_path.stat().st_size,
+            "etag": response_headers.get("ETag"),
+            "last_modified": response_headers.get("Last-Modified"),
+            "sha256": sha256,
+        }
+        line = json.dumps([url, entry]) + "\n"
+        with self._lock:
+            self.entries[url] = entry
+            if self._journal is None:
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+            self._journal.write(line)
+            self._journal.flush()
+            self._unsaved += 1
+
+    def save(self):
+        with self._lock:
+            if not self._unsaved and self.path.exists():
+                return
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+            # The snapshot now holds everything the journal did
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            self.journal_path.unlink(missing_ok=True)
+            self._unsaved = 0
@@ -0,0 +1,128 @@
+# name_index.py
+#
+# Substring search over the known NSFW subreddit list. Names are indexed by trigram: a query
+# intersects the posting lists of its trigrams and only verifies the few names left over,
+# instead of scanning the whole list. The index is pickled next to the list file and rebuilt
+# only when the file's size or mtime changes.
+
+import os
+import pickle
+import bisect
+from array import array
+
+KNOWN_NSFW_FILE = "known_nsfw.txt"
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 1
+GRAM_SIZE = 3
+
+def parse_names(path: str) -> list[str]:
+    with open(path, "r", encoding="utf-8") as file:
+        return sorted(set(
+            line.strip().replace("/r/", "").lower()
+            for line in file
+            if line.strip() and not line.startswith("#")
+        ))
+
+def file_stamp(path: str) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+def grams(text: str) -> set[str]:
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+class NameIndex:
+    def __init__(self, path: str = KNOWN_NSFW_FILE):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.stamp = None
+        self.names = []
+        self.postings = {}
+        self.refresh()
+
+    def refresh(self):
+        # Cheap enough to call before every query: one stat unless the file changed
+        stamp = file_stamp(self.path)
+        if stamp == self.stamp:
+            return
+        if stamp is None:
+            self.stamp, self.names, self.postings = None, [], {}
+            return
+        if not self._load(stamp):
+            self._build(stamp)
+
+    def _load(self, stamp) -> bool:
+        try:
+            with open(self.index_path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return False
+        if data.get("version") != INDEX_VERSION or data.get("stamp") != stamp:
+            return False
+        self.stamp, self.names, self.postings = stamp, data["names"], data["postings"]
+        return True
+
+    def _build(self, stamp):
+        names = parse_names(self.path)
+        postings = {}
+        for name_id, name in enumerate(names):
+            for gram in grams(name):
+                postings.setdefault(gram, array("I")).append(name_id)
+        self.stamp, self.names, self.postings = stamp, names, postings
+
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"version": INDEX_VERSION, "stamp": stamp, "names": names, "postings": postings}, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            pass  # a read-only folder just means rebuilding next run
+
+    def search(self, text: str) -> list[str]:
+        # All names containing text, in sorted order
+        self.refresh()
+        text = text.lower()
+        if len(text) < GRAM_SIZE:
+            return [name for name in self.names if text in name]
+        lists = []
+        for gram in grams(text):
+            posting = self.postings.get(gram)
+            if posting is None:
+                return []
+            lists.append(posting)
+        lists.sort(key=len)
+        candidates = set(lists[0])
+        for posting in lists[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        # Posting lists only say every trigram occurs somewhere; check the full substring
+        return [self.names[i] for i in sorted(candidates) if text in self.names[i]]
+
+    def prefix(self, text: str, limit: int | None = None) -> list[str]:
+        self.refresh()
+        text = text.lower()
+        start = bisect.bisect_left(self.names, text)
+        end = bisect.bisect_left(self.names, text + "\uffff", start)
+        return self.names[start:end if limit is None else min(end, start + limit)]
+
+    def suggest(self, text: str, limit: int = 20) -> list[str]:
+        # Completion order: names starting with text first, then names that only contain it
+        found = self.prefix(text, limit)
+        if len(found) < limit and text:
+            starts = set(found)
+            found += [name for name in self.search(text) if name not in starts][:limit - len(found)]
+        return found
+
+_indexes = {}
+
+def load_name_index(path: str = KNOWN_NSFW_FILE) -> NameIndex:
+    # One index per file for the life of the process
+    index = _indexes.get(path)
+    if index is None:
+        index = _indexes[path] = NameIndex(path)
+    else:
+        index.refresh()
+    return index
@@ -0,0 +1,198 @@
+# phash_index.py
+#
+# Near-duplicate detection for downloaded images. Each image gets a 64-bit dHash, computed
+# in a process pool, and lookups go through a BK-tree so a Hamming-radius query only visits
+# a small part of the index instead of comparing against every image.
+#
+#   python phash_index.py downloader --radius 5
+
+import os
+import sys
+import sqlite3
+import asyncio
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+INDEX_NAME = "phash.sqlite3"
+HASH_SIZE = 8
+DEFAULT_RADIUS = 5
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp")
+SCAN_CHUNK_SIZE = 64
+
+class NearDuplicate(Exception):
+    def __init__(self, match_path: str, distance: int):
+        super().__init__(f"near-duplicate of {match_path} (distance {distance})")
+        self.match_path = match_path
+        self.distance = distance
+
+def phash_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def compute_dhash(path: str) -> int | None:
+    # Runs inside the process pool; returns None for files Pillow cannot read
+    from PIL import Image
+    try:
+        with Image.open(path) as img:
+            img.draft("L", ((HASH_SIZE + 1) * 4, HASH_SIZE * 4))  # lets JPEG decode at reduced size
+            pixels = list(img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS).getdata())
+    except Exception:
+        return None
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+class BKTree:
+    # Nodes are [hash, item, children]; children maps edge distance -> node
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value: int, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, item, {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, item, {}]
+                return
+            node = child
+
+    def query(self, value: int, radius: int) -> list[tuple[int, object]]:
+        matches = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                matches.append((distance, node[1]))
+            # Triangle inequality: only subtrees whose edge lies within the radius can match
+            for edge, child in node[2].items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+def to_signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+class PHashIndex:
+    def __init__(self, cache_folder: str = "cache", radius: int = DEFAULT_RADIUS, workers: int | None = None):
+        os.makedirs(cache_folder, exist_ok=True)
+        self.radius = radius
+        self.workers = workers
+        self.conn = sqlite3.connect(os.path.join(cache_folder, INDEX_NAME), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS phashes (path TEXT PRIMARY KEY, hash INTEGER NOT NULL, size INTEGER, mtime REAL)")
+        self.tree = BKTree()
+        self.known = {}
+        for path, value, size, mtime in self.conn.execute("SELECT path, hash, size, mtime FROM phashes"):
+            self.known[path] = (size, mtime)
+            self.tree.add(to_unsigned(value), path)
+        self._executor = None
+        # Held from find() to add() by concurrent downloads, so two copies of one image that
+        # finish together cannot both miss each other
+        self.lock = asyncio.Lock()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        # spawn keeps the workers away from the Qt/asyncio state of the parent process
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+        self.conn.close()
+
+    def find(self, value: int, exclude: str | None = None) -> tuple[int, str] | None:
+        for distance, path in self.tree.query(value, self.radius):
+            if path != exclude and os.path.exists(path):
+                return distance, path
+        return None
+
+    def add(self, path: str, value: int, commit: bool = True):
+        stat = os.stat(path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO phashes (path, hash, size, mtime) VALUES (?, ?, ?, ?)",
+            (path, to_signed(value), stat.st_size, stat.st_mtime)
+        )
+        if commit:
+            self.conn.commit()
+        if path not in self.known:
+            self.tree.add(value, path)
+        self.known[path] = (stat.st_size, stat.st_mtime)
+
+    async def hash_async(self, path: str) -> int | None:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, compute_dhash, path)
+
+    async def check(self, path: str) -> tuple[int, str] | None:
+        value = await self.hash_async(path)
+        return (value, self.find(value)) if value is not None else None
+
+    def scan_folder(self, folder: str, on_duplicate=None) -> list[tuple[str, str, int]]:
+        # Bulk pass: hash everything not yet indexed, reporting each file that matches an earlier one
+        paths = []
+        seen_inodes = set()
+        for root, dirs, files in os.walk(folder):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for name in files:
+                if not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                # Hardlinks into the blob store are one image, not duplicates of each other
+                if (stat.st_dev, stat.st_ino) in seen_inodes:
+                    continue
+                seen_inodes.add((stat.st_dev, stat.st_ino))
+                if self.known.get(path) != (stat.st_size, stat.st_mtime):
+                    paths.append(path)
+
+        duplicates = []
+        for path, value in zip(paths, self.executor.map(compute_dhash, paths, chunksize=SCAN_CHUNK_SIZE)):
+            if value is None:
+                continue
+            match = self.find(value, exclude=path)
+            if match:
+                duplicates.append((path, match[1], match[0]))
+                if on_duplicate:
+                    on_duplicate(path, match[1], match[0])
+            self.add(path, value, commit=False)
+        self.conn.commit()
+        return duplicates
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find near-duplicate images in a download folder")
+    parser.add_argument("folder")
+    parser.add_argument("--radius", type=int, default=DEFAULT_RADIUS)
+    parser.add_argument("--cache-folder", default="cache")
+    args = parser.parse_args()
+
+    if not phash_available():
+        sys.exit("Pillow is required for perceptual hashing: pip install Pillow")
+
+    index = PHashIndex(args.cache_folder, args.radius)
+    try:
+        found = index.scan_folder(args.folder, lambda path, match, distance: print(f"{path} ~ {match} (distance {distance})"))
+        print(f"{len(found)} near-duplicates found, {index.tree.size} images indexed.")
+    finally:
+        index.close()
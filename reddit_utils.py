@@ -0,0 +1,305 @@
+# reddit_utils.py
+
+import os
+import re
+import asyncio
+import hashlib
+import contextlib
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+import aiohttp
+from utils import get_part_path, write_stream
+from background_loop import get_session
+from scheduler import DownloadScheduler
+from blobstore import BlobStore
+from phash_index import PHashIndex, NearDuplicate
+from download_index import DownloadIndex
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif")
+MAX_CONNECTIONS = 8
+LISTING_LIMIT = 1000  # Reddit stops paging listings around here anyway
+INFO_BATCH_SIZE = 100  # /api/info accepts up to 100 subreddits per request
+SUBREDDIT_META_TTL = 6 * 60 * 60
+MULTIREDDIT_CHUNK_SIZE = 50  # subreddits per combined "a+b+c" listing; keeps request URLs short
+TARGET_BACKLOG = 8  # posts held back per saturated target in case its pending downloads fail
+
+@dataclass(frozen=True, slots=True)
+class RedditPost:
+    # The few fields the downloader needs; the PRAW Submission is dropped as soon as this is built
+    id: str
+    url: str
+    created: float
+    over18: bool
+    subreddit: str
+
+    @classmethod
+    def from_submission(cls, submission) -> "RedditPost":
+        return cls(submission.id, submission.url.strip(), submission.created_utc, submission.over_18,
+                   submission.subreddit.display_name)
+
+def subreddit_source(subreddit_name: str) -> str:
+    # Folder name and download-index source for a subreddit, e.g. "r_earthporn"
+    name = subreddit_name.replace("/r/", "").replace("r/", "")
+    safe_name = re.sub(r'[^\w-]', '_', name.lower())
+    return f"r_{safe_name}"
+
+def is_image_url(url: str) -> bool:
+    return url.lower().endswith(IMAGE_EXTENSIONS)
+
+def lookup_subreddits(reddit, names, index: DownloadIndex | None = None, ttl: float = SUBREDDIT_META_TTL) -> dict[str, dict]:
+    # Metadata for many subreddits at once: fresh entries come from the index cache and the rest
+    # are fetched through /api/info, 100 names per request, instead of one lazy fetch per name.
+    # Names Reddit doesn't return (banned, private, misspelled) map to None.
+    names = list(dict.fromkeys(name.lower() for name in names))
+    results = index.get_subreddit_meta(names, ttl) if index else {}
+    missing = [name for name in names if name not in results]
+
+    fetched = {name: None for name in missing}
+    for start in range(0, len(missing), INFO_BATCH_SIZE):
+        for sub in reddit.info(subreddits=missing[start:start + INFO_BATCH_SIZE]):
+            fetched[sub.display_name.lower()] = {
+                "name": sub.display_name,
+                "title": sub.title,
+                "subscribers": sub.subscribers,
+                "over18": sub.over18,
+            }
+    if index and fetched:
+        index.put_subreddit_meta(fetched)
+
+    results.update(fetched)
+    return {name: meta if meta and meta["subscribers"] is not None else None for name, meta in results.items()}
+
+async def iter_posts(listing):
+    # PRAW pages lazily inside next(), so each step runs in a worker thread and a new page
+    # is only requested once the consumer has used up the previous one
+    iterator = iter(listing)
+    while True:
+        submission = await asyncio.to_thread(next, iterator, None)
+        if submission is None:
+            return
+        yield RedditPost.from_submission(submission)
+
+async def fetch_image(session: aiohttp.ClientSession, url: str, part_path: Path, hasher=None):
+    try:
+        async with session.get(url) as resp:
+            resp.raise_for_status()
+            await write_stream(resp, part_path, hasher=hasher)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+
+class DownloadTarget:
+    # One subreddit's destination plus the counters that keep its limit exact
+    __slots__ = ("source", "folder", "limit", "saved_urls", "pending", "backlog")
+
+    def __init__(self, source: str, folder: str, limit: int | None):
+        self.source = source
+        self.folder = folder
+        self.limit = limit
+        self.saved_urls = []
+        self.pending = 0
+        self.backlog = deque()
+
+    @property
+    def full(self) -> bool:
+        return bool(self.limit) and len(self.saved_urls) >= self.limit
+
+    @property
+    def saturated(self) -> bool:
+        # Enough downloads saved or in flight to reach the limit if they all succeed
+        return bool(self.limit) and len(self.saved_urls) + self.pending >= self.limit
+
+async def save_post(session: aiohttp.ClientSession, post: RedditPost, target: DownloadTarget,
+                    blob_store: BlobStore | None = None, phash_index: PHashIndex | None = None,
+                    skip_near_duplicates: bool = False, on_near_duplicate=None) -> str:
+    extension = os.path.splitext(post.url)[1]
+    # The final name carries the save order, so stream under the post id and rename on completion
+    part_path = get_part_path(Path(target.folder) / f"{target.source}_{post.id}{extension}")
+    hasher = hashlib.sha256()
+    await fetch_image(session, post.url, part_path, hasher)
+
+    # Hashing runs in the process pool outside the lock; only the lookup and the insert are serialised
+    value = await phash_index.hash_async(str(part_path)) if phash_index is not None else None
+    match = None
+    async with phash_index.lock if value is not None else contextlib.nullcontext():
+        if value is not None:
+            match = phash_index.find(value)
+            if match and skip_near_duplicates:
+                part_path.unlink(missing_ok=True)
+                raise NearDuplicate(match[1], match[0])
+
+        filename = os.path.join(target.folder, f"{target.source}_{len(target.saved_urls)}_{post.id}{extension}")
+        os.replace(part_path, filename)
+        # Claim the save-order number before the first await, so concurrent saves can't share it
+        target.saved_urls.append(post.url)
+        try:
+            if blob_store is not None:
+                await asyncio.to_thread(blob_store.ingest, Path(filename), hasher.hexdigest())
+            if value is not None:
+                await asyncio.to_thread(phash_index.add, filename, value)
+        except BaseException:
+            target.saved_urls.remove(post.url)
+            raise
+    if match and on_near_duplicate:
+        on_near_duplicate(post.url, filename, match[1], match[0])
+    return filename
+
+async def download_to_targets(candidates, targets: list[DownloadTarget], route, max_connections: int = MAX_CONNECTIONS,
+                              on_saved=None, on_error=None, **save_options):
+    # Feeds RedditPosts from an async iterable into one pooled session and one scheduler.
+    # route(post) picks the post's DownloadTarget (or None to drop it); callbacks get the source last.
+    async def fetch(job):
+        post, target = job
+        return await save_post(session, post, target, **save_options)
+
+    def on_done(job, filename):
+        post, target = job
+        target.pending -= 1
+        if on_saved:
+            on_saved(filename, post.url, len(target.saved_urls), target.source)
+
+    def on_fetch_error(job, error):
+        post, target = job
+        target.pending -= 1
+        if on_error:
+            on_error(post.url, error, target.source)
+
+    async def submit(post, target):
+        target.pending += 1
+        await scheduler.submit((post, target))
+
+    async def drain():
+        # Posts held back while a target was saturated go out as soon as it has room again
+        for target in targets:
+            if target.full:
+                target.backlog.clear()
+            while target.backlog and not target.saturated:
+                await submit(target.backlog.popleft(), target)
+
+    # The process-wide session; max_connections caps this job through its worker count
+    session = await get_session()
+    candidates = aiter(candidates)
+    try:
+        async with DownloadScheduler(fetch, max_connections, on_done, on_fetch_error) as scheduler:
+            while True:
+                await drain()
+                if all(t.full for t in targets):
+                    break
+                # Check before pulling the next post so no listing page is fetched needlessly
+                if all(t.saturated for t in targets):
+                    await scheduler.wait_for_progress()
+                    continue
+                post = await anext(candidates, None)
+                if post is None:
+                    break
+                target = route(post)
+                if target is None or target.full:
+                    continue
+                # Never keep more downloads pending than a target still needs, so each limit is exact.
+                # A saturated target's post waits in its backlog (or is dropped, to be listed again
+                # next run) so the listing keeps moving for the others.
+                if target.saturated:
+                    if len(target.backlog) < TARGET_BACKLOG:
+                        target.backlog.append(post)
+                    continue
+                await submit(post, target)
+
+            # The listing is done; backlogged posts still stand in for downloads that fail
+            await drain()
+            while any(t.backlog for t in targets):
+                await scheduler.wait_for_progress()
+                await drain()
+    finally:
+        if hasattr(candidates, "aclose"):
+            await candidates.aclose()
+
+async def download_reddit_images(candidates, download_folder: str, file_prefix: str, limit: int | None,
+                                 max_connections: int = MAX_CONNECTIONS, on_saved=None, on_error=None,
+                                 **save_options) -> list[str]:
+    # candidates is an async iterable of RedditPost; returns the saved URLs in completion order
+    target = DownloadTarget(file_prefix, download_folder, limit)
+    await download_to_targets(
+        candidates, [target], lambda post: target, max_connections,
+        on_saved=(lambda filename, url, count, source: on_saved(filename, url, count)) if on_saved else None,
+        on_error=(lambda url, error, source: on_error(url, error)) if on_error else None,
+        **save_options
+    )
+    return target.saved_urls
+
+async def download_subreddits_batch(reddit, subreddit_names, master_folder: str, index: DownloadIndex, limit: int | None,
+                                    listing: str = "hot", allow_sfw: bool = True, allow_nsfw: bool = True,
+                                    chunk_size: int = MULTIREDDIT_CHUNK_SIZE, max_connections: int = MAX_CONNECTIONS,
+                                    on_saved=None, on_error=None, **save_options) -> dict[str, list[str]]:
+    # Lists many subreddits through combined "a+b+c" listings and routes each post to its own
+    # r_<name> folder; all of them share one session and one connection budget.
+    # Reddit caps a combined listing at ~1000 posts, so very long chunks dilute per-subreddit depth.
+    targets = {}
+    for name in subreddit_names:
+        source = subreddit_source(name)
+        if source not in targets:
+            folder = os.path.join(master_folder, source)
+            os.makedirs(folder, exist_ok=True)
+            targets[source] = DownloadTarget(source, folder, limit)
+    names = [source[2:] for source in targets]
+    chunks = [names[i:i + chunk_size] for i in range(0, len(names), chunk_size)]
+
+    async def candidates():
+        for chunk in chunks:
+            chunk_targets = [targets[f"r_{name}"] for name in chunk]
+            posts = getattr(reddit.subreddit("+".join(chunk)), listing)(limit=LISTING_LIMIT)
+            async for post in iter_posts(posts):
+                if all(t.full for t in chunk_targets):
+                    break
+                target = targets.get(subreddit_source(post.subreddit))
+                # Combined listings carry no subreddit metadata, so the NSFW filter goes by the post flag
+                if target is None or (post.over18 and not allow_nsfw) or (not post.over18 and not allow_sfw):
+                    continue
+                # SQLite lookups go to a worker thread so the shared loop keeps serving other jobs
+                if is_image_url(post.url) and not await asyncio.to_thread(index.contains, target.source, post.url):
+                    yield post
+
+    route = lambda post: targets.get(subreddit_source(post.subreddit))
+    await download_to_targets(candidates(), list(targets.values()), route, max_connections, on_saved, on_error, **save_options)
+    return {source: target.saved_urls for source, target in targets.items()}
+
+async def sync_subreddit(subreddit, source: str, download_folder: str, index: DownloadIndex, limit: int | None = None,
+                         listing: str = "new", time_filter: str = "day", on_error=None, **download_options) -> list[str]:
+    # "new" is newest-first, so paging stops at the newest post the previous sync processed.
+    # "top" has no such order; it relies on the download index alone to skip known posts.
+    watermark = index.get_watermark(source, listing) if listing == "new" else None
+    listed = []  # (post id, created) of every post read, newest first
+    positions = {}  # url -> its post's position in listed
+    failed = set()
+    caught_up = False
+
+    async def candidates():
+        nonlocal caught_up
+        if listing == "top":
+            posts = subreddit.top(time_filter=time_filter, limit=LISTING_LIMIT)
+        else:
+            posts = subreddit.new(limit=LISTING_LIMIT)
+        async for post in iter_posts(posts):
+            if watermark and (post.id == watermark[0] or post.created < watermark[1]):
+                break
+            positions[post.url] = len(listed)
+            listed.append((post.id, post.created))
+            if is_image_url(post.url) and not await asyncio.to_thread(index.contains, source, post.url):
+                yield post
+        # Only reached when the listing was read up to the watermark, not when the limit cut it short
+        caught_up = True
+
+    def on_fetch_error(url, error):
+        # Skipped near-duplicates are settled; anything else has to be listed again next run
+        if not isinstance(error, NearDuplicate):
+            failed.add(positions[url])
+        if on_error:
+            on_error(url, error)
+
+    saved_urls = await download_reddit_images(candidates(), download_folder, source, limit, on_error=on_fetch_error, **download_options)
+    if listing == "new" and caught_up and listed:
+        # Stop short of the oldest failure, so the next sync reads down to it and retries it
+        stop = max(failed) + 1 if failed else 0
+        if stop < len(listed):
+            index.set_watermark(source, listing, *listed[stop])
+    return saved_urls
@@ -2,8 +2,18 @@ import praw
 from dotenv import load_dotenv
 import os
 import requests
-import re
 import shutil
+import json
+import time
+import asyncio
+import threading
+from reddit_utils import is_image_url, download_reddit_images, subreddit_source, iter_posts, sync_subreddit, download_subreddits_batch
+from reddit_utils import lookup_subreddits
+from download_index import DownloadIndex, IndexWriter
+from background_loop import run_in_background
+from blobstore import BlobStore, copy_tree
+from phash_index import PHashIndex, NearDuplicate, phash_available
+from name_index import load_name_index
 
 # --- Load environment variables ---
 load_dotenv()
@@ -22,18 +32,10 @@ reddit = praw.Reddit(
     password=password
 )
 
-print("Logged in as:", reddit.user.me())
-
 # --- Load known NSFW subreddit names from file ---
 def load_known_nsfw(filepath="known_nsfw.txt"):
-    if not os.path.exists(filepath):
-        return []
-    with open(filepath, "r", encoding="utf-8") as file:
-        return sorted(set(
-            line.strip().replace("/r/", "").lower()
-            for line in file
-            if line.strip() and not line.startswith("#")
-        ))
+    # Loaded and indexed once; later calls only re-stat the file
+    return load_name_index(filepath)
 
 # --- Clear master folder ---
 def clear_master_folder(master_folder="communitydownloader"):
@@ -57,16 +59,62 @@ def clear_master_folder(master_folder="communitydownloader"):
     except Exception as e:
         print(f"❌ Failed to delete contents: {e}")
 
+# --- Near-duplicate scan ---
+def find_near_duplicates(master_folder="communitydownloader", cache_folder="cache"):
+    if not os.path.exists(master_folder):
+        print(f"Master folder '{master_folder}' does not exist.")
+        return
+    if not phash_available():
+        print("Pillow is required for near-duplicate detection (pip install Pillow).")
+        return
+
+    index = PHashIndex(cache_folder)
+    try:
+        duplicates = index.scan_folder(master_folder, lambda path, match, distance: print(f"🔁 {path} ~ {match} (distance {distance})"))
+        print(f"{len(duplicates)} near-duplicates found among {index.tree.size} indexed images.")
+    finally:
+        index.close()
+
+# --- Near-duplicate handling for downloads: None, "flag" or "skip" ---
+def ask_near_duplicates():
+    print("\nNear-duplicate images:")
+    print("1. Keep them")
+    print("2. Keep and flag them")
+    print("3. Skip them\n")
+    return {"2": "flag", "3": "skip"}.get(input("Select an option [1/2/3]: ").strip())
+
+def open_phash_index(near_duplicates, cache_folder="cache"):
+    if not near_duplicates:
+        return None
+    if not phash_available():
+        print("Pillow is not installed; near-duplicate detection is off.")
+        return None
+    return PHashIndex(cache_folder)
+
+def near_duplicate_options(near_duplicates, phash_index):
+    return {
+        "phash_index": phash_index,
+        "skip_near_duplicates": near_duplicates == "skip",
+        "on_near_duplicate": lambda url, filename, match_path, distance: print(f"🔁 Near-duplicate: {filename} ~ {match_path} (distance {distance})"),
+    }
+
+def report_download_error(writer, source, url, error):
+    if isinstance(error, NearDuplicate):
+        # Remember it so the same repost isn't fetched again next run
+        writer.add(source, url)
+        print(f"Skipped {url}: {error}")
+    else:
+        print(f"Failed to download {url}: {error}")
+
 # --- Downloader ---
-def download_images_from_subreddit(subreddit_name, limit=20, master_folder="communitydownloader", cache_folder="cache"):
+def download_images_from_subreddit(subreddit_name, limit=20, master_folder="communitydownloader", cache_folder="cache", near_duplicates=None):
     subreddit_name = subreddit_name.replace("/r/", "").replace("r/", "")
     subreddit = reddit.subreddit(subreddit_name)
     print(f"Downloading up to {limit} new images from r/{subreddit.display_name}...")
 
     # --- Folder setup ---
     os.makedirs(master_folder, exist_ok=True)
-    safe_name = re.sub(r'[^\w\-]', '_', subreddit_name.lower())
-    subfolder_name = f"r_{safe_name}"
+    subfolder_name = subreddit_source(subreddit_name)
     download_folder = os.path.join(master_folder, subfolder_name)
 
     try:
@@ -75,57 +123,113 @@ def download_images_from_subreddit(subreddit_name, limit=20, master_folder="comm
         print(f"Failed to create folder {download_folder}: {e}")
         return
 
-    # --- Cache setup ---
-    os.makedirs(cache_folder, exist_ok=True)
-    cache_file = os.path.join(cache_folder, f"{subfolder_name}.txt")
+    # --- Download index (replaces the per-subreddit .txt cache) ---
+    index = DownloadIndex(cache_folder)
+    writer = IndexWriter(index)
 
-    # --- Load cache ---
-    if os.path.exists(cache_file):
-        with open(cache_file, "r") as f:
-            cached_urls = set(line.strip() for line in f if line.strip())
-    else:
-        cached_urls = set()
+    def on_saved(filename, url, count):
+        writer.add(subfolder_name, url, filename)
+        print(f"Saved: {filename}")
 
-    count = 0
-    new_urls = []
+    # --- Download in parallel over one pooled session while the listing streams in ---
+    async def candidates():
+        async for post in iter_posts(subreddit.hot(limit=100)):
+            if is_image_url(post.url) and not await asyncio.to_thread(index.contains, subfolder_name, post.url):
+                yield post
 
-    for post in subreddit.hot(limit=100):
-        url = post.url.strip()
+    phash_index = open_phash_index(near_duplicates, cache_folder)
+    try:
+        new_urls = run_in_background(download_reddit_images(
+            candidates(), download_folder, subfolder_name, limit,
+            on_saved=on_saved,
+            on_error=lambda url, e: report_download_error(writer, subfolder_name, url, e),
+            blob_store=BlobStore(master_folder),
+            **near_duplicate_options(near_duplicates, phash_index)
+        ))
+    finally:
+        writer.close()
+        index.close()
+        if phash_index:
+            phash_index.close()
+    count = len(new_urls)
 
-        if url.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')) and url not in cached_urls:
-            try:
-                image_data = requests.get(url).content
-                extension = os.path.splitext(url)[1]
-                filename = os.path.join(download_folder, f"{subfolder_name}_{count}_{post.id}{extension}")
-                with open(filename, "wb") as f:
-                    f.write(image_data)
+    if count == 0:
+        print("No new images found (all duplicates).")
+    else:
+        print(f"{count} new images downloaded to '{os.path.abspath(download_folder)}'")
+
+# --- Incremental sync: only posts newer than the last sync ---
+def sync_subreddits(subreddit_names, limit=None, master_folder="communitydownloader", cache_folder="cache", listing="new", time_filter="day", near_duplicates=None):
+    index = DownloadIndex(cache_folder)
+    writer = IndexWriter(index)
+    blob_store = BlobStore(master_folder)
+    phash_index = open_phash_index(near_duplicates, cache_folder)
+    try:
+        for subreddit_name in subreddit_names:
+            subfolder_name = subreddit_source(subreddit_name)
+            download_folder = os.path.join(master_folder, subfolder_name)
+            os.makedirs(download_folder, exist_ok=True)
+
+            def on_saved(filename, url, count, source=subfolder_name):
+                writer.add(source, url, filename)
                 print(f"Saved: {filename}")
-                count += 1
-                new_urls.append(url)
 
-                if count >= limit:
-                    break
+            try:
+                new_urls = run_in_background(sync_subreddit(
+                    reddit.subreddit(subreddit_name.replace("/r/", "").replace("r/", "")),
+                    subfolder_name, download_folder, index, limit, listing, time_filter,
+                    on_saved=on_saved,
+                    on_error=lambda url, e, source=subfolder_name: report_download_error(writer, source, url, e),
+                    blob_store=blob_store,
+                    **near_duplicate_options(near_duplicates, phash_index)
+                ))
+                print(f"r/{subreddit_name}: {len(new_urls)} new images.")
             except Exception as e:
-                print(f"Failed to download {url}: {e}")
+                print(f"Failed to sync r/{subreddit_name}: {e}")
+    finally:
+        writer.close()
+        index.close()
+        if phash_index:
+            phash_index.close()
+
+# --- Batch download: many subreddits through combined listings ---
+def download_images_from_subreddits(subreddit_names, limit=20, master_folder="communitydownloader", cache_folder="cache", near_duplicates=None):
+    os.makedirs(master_folder, exist_ok=True)
+    index = DownloadIndex(cache_folder)
+    writer = IndexWriter(index)
+    phash_index = open_phash_index(near_duplicates, cache_folder)
 
-    # --- Update cache ---
-    if new_urls:
-        with open(cache_file, "a") as f:
-            for url in new_urls:
-                f.write(url + "\n")
+    def on_saved(filename, url, count, source):
+        writer.add(source, url, filename)
+        print(f"Saved: {filename}")
 
-    if count == 0:
-        print("No new images found (all duplicates).")
-    else:
-        print(f"{count} new images downloaded to '{os.path.abspath(download_folder)}'")
+    try:
+        results = run_in_background(download_subreddits_batch(
+            reddit, subreddit_names, master_folder, index, limit,
+            on_saved=on_saved,
+            on_error=lambda url, e, source: report_download_error(writer, source, url, e),
+            blob_store=BlobStore(master_folder),
+            **near_duplicate_options(near_duplicates, phash_index)
+        ))
+    finally:
+        writer.close()
+        index.close()
+        if phash_index:
+            phash_index.close()
+
+    for source, new_urls in results.items():
+        print(f"r/{source[2:]}: {len(new_urls)} new images.")
+    print(f"{sum(len(urls) for urls in results.values())} new images downloaded to '{os.path.abspath(master_folder)}'")
 
 # --- Clear subreddit cache ---
 def clear_subreddit_cache(subreddit_name, cache_folder="cache"):
-    safe_name = subreddit_name.replace("/", "_").lower()
-    cache_file = os.path.join(cache_folder, f"r_{safe_name}.txt")
+    index = DownloadIndex(cache_folder)
+    try:
+        removed = index.clear_source(subreddit_source(subreddit_name))
+    finally:
+        index.close()
 
-    if os.path.exists(cache_file):
-        os.remove(cache_file)
+    if removed:
         print(f"Cache for r/{subreddit_name} cleared.")
     else:
         print(f"No cache found for r/{subreddit_name}.")
@@ -136,17 +240,18 @@ def clear_all_subreddit_caches(cache_folder="cache"):
         print(f"Cache folder '{cache_folder}' does not exist.")
         return
 
-    confirm = input(f"⚠️ This will permanently delete all cache files in '{cache_folder}'. Continue? [y/N]: ").strip().lower()
+    confirm = input(f"⚠️ This will permanently delete all cached download records in '{cache_folder}'. Continue? [y/N]: ").strip().lower()
     if confirm != "y":
         print("❌ Deletion cancelled.")
         return
 
     try:
-        for item in os.listdir(cache_folder):
-            path = os.path.join(cache_folder, item)
-            if os.path.isfile(path):
-                os.unlink(path)
-        print(f"✅ All cache files deleted from '{cache_folder}'.")
+        index = DownloadIndex(cache_folder)
+        try:
+            removed = index.clear_downloads()
+        finally:
+            index.close()
+        print(f"✅ {removed} cached download records deleted from '{cache_folder}'.")
     except Exception as e:
         print(f"❌ Failed to delete cache files: {e}")
 
@@ -173,7 +278,7 @@ def copy_master_folder(master_folder="communitydownloader"):
         shutil.rmtree(dest_path)
 
     try:
-        shutil.copytree(master_folder, dest_path)
+        copy_tree(master_folder, dest_path)
         print(f"Successfully copied to: {dest_path}")
     except Exception as e:
         print(f"Failed to copy folder: {e}")
@@ -200,23 +305,24 @@ def search_hybrid_subreddits(keyword, limit=100, nsfw_filter="both"):
                     })
                     seen_subreddits.add(name)
 
-    # NSFW list
+    # NSFW list: one batched, cached metadata lookup instead of a fetch per name
     if nsfw_filter in ("nsfw", "both"):
-        known_nsfw = load_known_nsfw()
-        for name in known_nsfw:
-            if keyword_lower in name and name not in seen_subreddits:
-                try:
-                    sub = reddit.subreddit(name)
-                    if sub.over18 and sub.subscribers is not None:
-                        results.append({
-                            "name": sub.display_name,
-                            "title": sub.title,
-                            "subscribers": sub.subscribers,
-                            "over18": sub.over18
-                        })
-                        seen_subreddits.add(name)
-                except Exception as e:
-                    print(f"Error loading r/{name}: {e}")
+        matches = [name for name in load_known_nsfw().search(keyword_lower) if name not in seen_subreddits]
+        try:
+            index = DownloadIndex()
+            try:
+                metadata = lookup_subreddits(reddit, matches, index)
+            finally:
+                index.close()
+        except Exception as e:
+            print(f"Error loading subreddit details: {e}")
+            metadata = {}
+
+        for name in matches:
+            meta = metadata.get(name)
+            if meta and meta["over18"]:
+                results.append(meta)
+                seen_subreddits.add(name)
 
     if not results:
         print("No subreddits found with that keyword and filter.")
@@ -236,7 +342,7 @@ def search_hybrid_subreddits(keyword, limit=100, nsfw_filter="both"):
             selected = results[choice - 1]
             try:
                 max_images = int(input("How many images would you like to download? (e.g. 5): "))
-                download_images_from_subreddit(selected["name"], limit=max_images)
+                download_images_from_subreddit(selected["name"], limit=max_images, near_duplicates=ask_near_duplicates())
             except ValueError:
                 print("Invalid number. Skipping image download.")
         else:
@@ -246,21 +352,61 @@ def search_hybrid_subreddits(keyword, limit=100, nsfw_filter="both"):
 
 
 # --- Update known NSFW subreddit list ---
-def update_nsfw_list(url="https://raw.githubusercontent.com/IcyOtter/redditNSFW/main/known_nsfw.txt",
-                     local_path="known_nsfw.txt"):
+NSFW_LIST_URL = "https://raw.githubusercontent.com/IcyOtter/redditNSFW/main/known_nsfw.txt"
+NSFW_LIST_REFRESH_HOURS = float(os.getenv("NSFW_LIST_REFRESH_HOURS", "24"))
+NSFW_LIST_TIMEOUT = 10
+
+def update_nsfw_list(url=NSFW_LIST_URL, local_path="known_nsfw.txt", refresh_hours=NSFW_LIST_REFRESH_HOURS, force=False):
+    # Checked at most once per refresh_hours; validators from the last download make an
+    # unchanged list a 304. State lives next to the list in <local_path>.meta.json.
+    meta_path = local_path + ".meta.json"
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = {}
+
+    have_list = os.path.exists(local_path)
+    if have_list and not force and time.time() - meta.get("checked_at", 0) < refresh_hours * 3600:
+        return
+
+    headers = {}
+    if have_list:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        response = requests.get(url, headers=headers, timeout=NSFW_LIST_TIMEOUT)
+    except (requests.ConnectionError, requests.Timeout):
+        return  # offline: keep the current list and try again next start
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        with open(local_path, "w") as f:
-            f.write(response.text)
-        print(f"NSFW list updated. {len(response.text.splitlines())} entries saved to {local_path}")
+        if response.status_code != 304:
+            response.raise_for_status()
+            tmp_path = local_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(response.text)
+            os.replace(tmp_path, local_path)
+            meta = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+            print(f"NSFW list updated. {len(response.text.splitlines())} entries saved to {local_path}")
+        meta["checked_at"] = time.time()
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
     except Exception as e:
         print(f"Failed to update NSFW list: {e}")
 
 # --- Main part of script ---
-while True:
-    if __name__ == "__main__":
-        update_nsfw_list()  # Update the known NSFW list at startup
+if __name__ == "__main__":
+    # Kept under the main guard: near-duplicate scans spawn worker processes that re-import this module
+    print("Logged in as:", reddit.user.me())
+
+    # Refreshed in the background; the name index picks up the new file on its next search
+    threading.Thread(target=update_nsfw_list, daemon=True).start()
+
+    while True:
 
         print("\nMain options:")
         print("1. Search subreddits and optionally download images")
@@ -268,9 +414,12 @@ while True:
         print("3. Cache management")
         print("4. Backup master download folder")
         print("5. Clear master folder")
+        print("6. Find near-duplicate images in master folder")
+        print("7. Sync subreddits (only posts since the last sync)")
+        print("8. Download images from many subreddits at once")
         print("0. Exit\n")
 
-        main_choice = input("Choose an action [0–4]: ").strip()
+        main_choice = input("Choose an action [0–8]: ").strip()
 
         if main_choice == "1":
             keyword = input("Enter a keyword to search in subreddit names: ").strip()
@@ -293,7 +442,7 @@ while True:
             sub = input("Enter the subreddit name (no /r/): ").strip()
             try:
                 max_images = int(input("How many images would you like to download? (e.g. 5): "))
-                download_images_from_subreddit(sub, limit=max_images)
+                download_images_from_subreddit(sub, limit=max_images, near_duplicates=ask_near_duplicates())
             except ValueError:
                 print("Invalid number. Skipping image download.")
 
@@ -314,6 +463,29 @@ while True:
         elif main_choice == "5":
             clear_master_folder()
 
+        elif main_choice == "6":
+            find_near_duplicates()
+
+        elif main_choice == "7":
+            names = [name.strip() for name in input("Enter subreddit names separated by commas (no /r/): ").split(",") if name.strip()]
+            print("\nListing options:")
+            print("1. New posts since the last sync")
+            print("2. Top posts of the day")
+            print("3. Top posts of the week\n")
+            listing, time_filter = {
+                "2": ("top", "day"),
+                "3": ("top", "week"),
+            }.get(input("Select a listing [1/2/3]: ").strip(), ("new", "day"))
+            sync_subreddits(names, listing=listing, time_filter=time_filter, near_duplicates=ask_near_duplicates())
+
+        elif main_choice == "8":
+            names = [name.strip() for name in input("Enter subreddit names separated by commas (no /r/): ").split(",") if name.strip()]
+            try:
+                max_images = int(input("How many images per subreddit? (e.g. 5): "))
+                download_images_from_subreddits(names, limit=max_images, near_duplicates=ask_near_duplicates())
+            except ValueError:
+                print("Invalid number. Skipping image download.")
+
         elif main_choice == "0":
             print("Exiting.")
             exit()
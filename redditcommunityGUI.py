@@ -1,14 +1,21 @@
-import sys, os, re, praw, shutil, webbrowser
+import sys, os, re, praw, shutil, webbrowser, bisect
 from dotenv import load_dotenv
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QLabel, QPushButton, QVBoxLayout,
     QHBoxLayout, QLineEdit, QTextEdit, QMessageBox, QCheckBox, QListWidget, QComboBox, QFileDialog, 
     QMenu, QAction, QMainWindow, QProgressBar
 )
-from download_threads import Download4chanThread, DownloadEromeThread, DownloaderThread, DownloadMotherlessThread
-from utils import collect_album_data, download_album_files
+from download_threads import DownloaderThread, MediaDownloadThread, SubredditSearchThread
+from extractors import find_extractor
 from gui_setup import setup_gui, setup_menu
 from config import get_reddit_client
+from download_index import DownloadIndex
+from blobstore import copy_tree
+from reddit_utils import subreddit_source
+from name_index import load_name_index
+from search_cache import SearchCache
+
+SUGGESTION_LIMIT = 20
 
 class RedditDownloaderGUI(QMainWindow):
     def __init__(self, reddit_client):
@@ -16,8 +23,16 @@ class RedditDownloaderGUI(QMainWindow):
         self.setWindowTitle("Image Downloader")
         self.setMinimumWidth(800)
         self.master_folder = "downloader"
+        self.cache_folder = "cache"
         self.link_log_file = "downloaded_links.log"
         self.reddit = reddit_client
+        self.download_index = DownloadIndex(self.cache_folder, self.link_log_file)
+        self.nsfw_names = load_name_index()
+        self.search_cache = SearchCache()
+        self.search_generation = 0
+        self.search_threads = set()
+        self.shown_subscribers = []  # negated subscriber counts of the listed results, kept sorted
+        self.shown_results = set()
 
         # Setup GUI and Menu. Found in gui_setup.py
         setup_gui(self)
@@ -26,6 +41,7 @@ class RedditDownloaderGUI(QMainWindow):
 
     def connect_signals(self):
         self.search_button.clicked.connect(self.search_subreddits)
+        self.keyword_input.textEdited.connect(self.update_suggestions)
         self.download_button.clicked.connect(self.download_images)
         self.clear_cache_button.clicked.connect(self.clear_all_caches)
         self.clear_selected_cache_button.clicked.connect(self.clear_selected_cache)
@@ -43,24 +59,18 @@ class RedditDownloaderGUI(QMainWindow):
     # --- Logging ---
     def log_downloaded_link(self, source: str, url: str):
         try:
-            if os.path.exists(self.link_log_file):
-                with open(self.link_log_file, "r") as f:
-                    if any(url in line for line in f):
-                        return  # URL already logged
-
-            with open(self.link_log_file, "a") as f:
-                f.write(f"[{source.upper()}] {url}\n")
+            self.download_index.log_link(source, url)
         except Exception as e:
             self.log(f"Failed to log link: {e}")
 
     def view_link_log(self):
         try:
-            if not os.path.exists(self.link_log_file):
-                QMessageBox.information(self, "Link Log", "No log file found yet.")
+            links = self.download_index.links()
+            if not links:
+                QMessageBox.information(self, "Link Log", "No logged links yet.")
                 return
 
-            with open(self.link_log_file, "r") as f:
-                content = f.read()
+            content = "\n".join(f"[{source}] {url}" for source, url in links)
 
             log_window = QMessageBox(self)
             log_window.setWindowTitle("Downloaded Links Log")
@@ -84,16 +94,9 @@ class RedditDownloaderGUI(QMainWindow):
 
 
     def clear_all_caches(self):
-        cache_folder = "cache"
-        if not os.path.exists(cache_folder):
-            self.log("Cache folder does not exist.")
-            return
         try:
-            for item in os.listdir(cache_folder):
-                path = os.path.join(cache_folder, item)
-                if os.path.isfile(path):
-                    os.unlink(path)
-            self.log("All cache files deleted.")
+            removed = self.download_index.clear_downloads()
+            self.log(f"All caches cleared ({removed} records).")
         except Exception as e:
             self.log(f"Failed to clear caches: {e}")
 
@@ -109,15 +112,11 @@ class RedditDownloaderGUI(QMainWindow):
             self.log("Could not determine subreddit name from selection.")
             return
 
-        safe_name = re.sub(r'[^\w\-]', '_', subreddit_name.lower())
-        cache_file = os.path.join("cache", f"r_{safe_name}.txt")
-
         try:
-            if os.path.exists(cache_file):
-                os.remove(cache_file)
+            if self.download_index.clear_source(subreddit_source(subreddit_name)):
                 self.log(f"Cache cleared for r/{subreddit_name}.")
             else:
-                self.log(f"No cache file found for r/{subreddit_name}.")
+                self.log(f"No cache found for r/{subreddit_name}.")
         except Exception as e:
             self.log(f"Failed to clear cache for r/{subreddit_name}: {e}")
 
@@ -151,20 +150,11 @@ class RedditDownloaderGUI(QMainWindow):
             dest_path = os.path.join(target_dir, os.path.basename(self.master_folder))
             if os.path.exists(dest_path):
                 shutil.rmtree(dest_path)
-            shutil.copytree(self.master_folder, dest_path)
+            copy_tree(self.master_folder, dest_path)
             self.log(f"Master folder copied to {dest_path}")
         except Exception as e:
             self.log(f"Failed to copy master folder: {e}")
 
-    async def download_erome_gallery(self, url):
-        try:
-            await self.dump(url=url, max_connections=5, skip_videos=False, skip_images=False)
-            self.log_downloaded_link("EROME", url)
-            self.log("Erome gallery downloaded.")
-        except Exception as e:
-            self.log(f"Erome download error: {e}")
-
-
     def download_images(self):
         selected = self.subreddit_list.currentItem()
         if not selected:
@@ -173,44 +163,14 @@ class RedditDownloaderGUI(QMainWindow):
 
         text = selected.text().strip()
 
-        if "erome.com" in text:
+        extractor = find_extractor(text.split()[0]) if text else None
+        if extractor:
             self.progress_bar.setValue(0)
             self.progress_bar.setFormat("Progress: %p%")
-            self.download_thread = DownloadEromeThread(
-                text,
-                self.master_folder,
-                collect_album_data,
-                download_album_files
-            )
+            self.download_thread = MediaDownloadThread(text, self.master_folder, extractor, log_link_callback=self.log_downloaded_link)
             self.download_thread.progress_updated.connect(self.update_progress)
             self.download_thread.log_message.connect(self.log)
             self.download_thread.start()
-            self.log_downloaded_link("EROME", text)
-            return
-
-
-        if "boards.4chan.org" in text:
-            self.progress_bar.setValue(0)
-            self.progress_bar.setFormat("Progress: %p%")
-            self.download_thread = Download4chanThread(text, self.master_folder)
-            self.download_thread.progress_updated.connect(self.update_progress)
-            self.download_thread.log_message.connect(self.log)
-            self.download_thread.start()
-
-            self.log_downloaded_link("4chan", text)
-            return
-        
-        if "motherless.com" in text:
-            self.progress_bar.setValue(0)
-            self.progress_bar.setFormat("Progress: %p%")
-            self.download_thread = DownloadMotherlessThread(
-                text,
-                self.master_folder,
-            )
-            self.download_thread.progress_updated.connect(self.update_progress)
-            self.download_thread.log_message.connect(self.log)
-            self.download_thread.start()
-            self.log_downloaded_link("MOTHERLESS", text)
             return
 
         try:
@@ -225,11 +185,22 @@ class RedditDownloaderGUI(QMainWindow):
         allow_nsfw = self.nsfw_checkbox.isChecked()
 
         self.progress_bar.setValue(0)
-        self.thread = DownloaderThread(subreddit_name, limit, allow_sfw, allow_nsfw, self.master_folder, "cache", reddit)
+        near_duplicates = {"Flag": "flag", "Skip": "skip"}.get(self.near_dup_combo.currentText())
+        self.thread = DownloaderThread(subreddit_name, limit, allow_sfw, allow_nsfw, self.master_folder, self.cache_folder, self.reddit, near_duplicates=near_duplicates)
         self.thread.progress_updated.connect(self.update_progress)
         self.thread.log_message.connect(self.log)
         self.thread.start()
 
+    def update_suggestions(self, text):
+        text = text.strip().lower()
+        if len(text) < 2 or "." in text or not self.nsfw_checkbox.isChecked():
+            suggestions = []
+        else:
+            suggestions = self.nsfw_names.suggest(text, SUGGESTION_LIMIT)
+        self.keyword_completer.model().setStringList(suggestions)
+        if suggestions:
+            self.keyword_completer.complete()
+
     def search_subreddits(self):
         keyword = self.keyword_input.text().strip().lower()
         self.detected_type_label.setText("Detected Type: None")
@@ -240,64 +211,77 @@ class RedditDownloaderGUI(QMainWindow):
         self.count_container.show()
 
         self.subreddit_list.clear()
+        # Results still arriving from an earlier search are dropped from here on
+        self.search_generation += 1
+        self.shown_subscribers = []
+        self.shown_results = set()
 
         if not keyword:
             QMessageBox.warning(self, "Input Error", "Please enter a keyword or subreddit name to search.")
             return
 
-        # Auto-detect what website the user is trying to download from
-        if "erome.com" in keyword:
-            self.subreddit_list.clear()
-            self.subreddit_list.addItem(keyword)
-            self.detected_type_label.setText("Detected Type: Erome Gallery")
+        # Auto-detect what website the user is trying to download from. URLs keep their
+        # original case: gallery IDs in them are case-sensitive.
+        url = self.keyword_input.text().strip()
+        extractor = find_extractor(url)
+        if extractor:
+            self.subreddit_list.addItem(url)
+            self.detected_type_label.setText(f"Detected Type: {extractor.label}")
             self.count_container.hide()
-            self.log("Erome gallery ready for download.")
+            self.log(f"{extractor.label} ready for download.")
             return
 
-        elif "4chan.org" in keyword:
-            self.subreddit_list.clear()
-            self.subreddit_list.addItem(keyword)
-            self.detected_type_label.setText("Detected Type: 4chan Thread")
-            self.count_container.hide()
-            self.log("4chan thread ready for download.")
-            return
-        
-        elif "motherless.com" in keyword:
-            self.subreddit_list.clear()
-            self.subreddit_list.addItem(keyword)
-            self.detected_type_label.setText("Detected Type: Motherless Thread")
-            self.count_container.hide()
-            self.log("Motherless thread ready for download.")
+        # Searches run in a worker; cached results show at once and stale ones are refreshed behind them
+        key = (keyword, search_type, allow_sfw, allow_nsfw)
+        cached = self.search_cache.get(key)
+        if cached:
+            results, fresh = cached
+            self.show_search_results(results)
+            if fresh:
+                return
+            self.start_search(key, stream=False)
+        else:
+            self.start_search(key, stream=True)
+
+    def start_search(self, key, stream):
+        thread = SubredditSearchThread(self.search_generation, key, self.reddit, nsfw_names=self.nsfw_names, cache_folder=self.cache_folder)
+        if stream:
+            thread.result_found.connect(self.add_search_result)
+        thread.search_finished.connect(self.finish_search)
+        thread.log_message.connect(self.log)
+        # Keep a reference until the thread ends; Qt aborts on destroying a running QThread
+        self.search_threads.add(thread)
+        thread.finished.connect(lambda: self.search_threads.discard(thread))
+        thread.start()
+
+    def add_search_result(self, generation, result):
+        if generation != self.search_generation:
+            return  # a newer search has replaced the list
+        name, title, subs, over18 = result
+        position = bisect.bisect_right(self.shown_subscribers, -subs)
+        self.shown_subscribers.insert(position, -subs)
+        self.shown_results.add(result)
+        tag = "🔞" if over18 else "✅"
+        self.subreddit_list.insertItem(position, f"{tag} r/{name} ({subs:,} members) - {title}")
+        self.filter_container.show()
+        self.detected_type_label.setText("Detected Type: Reddit Subreddit Search")
+
+    def show_search_results(self, results):
+        self.subreddit_list.clear()
+        self.shown_subscribers = []
+        self.shown_results = set()
+        for result in results:
+            self.add_search_result(self.search_generation, result)
+
+    def finish_search(self, generation, key, results):
+        self.search_cache.put(key, results)
+        if generation != self.search_generation:
             return
-
-
-        try:
-            results = []
-            if search_type in ("Search by keyword", "Search by subreddit name"):
-                search_type = self.search_type_combo.currentText()
-                for subreddit in reddit.subreddits.search(keyword, limit=100):
-                    if subreddit.subscribers is not None:
-                        if subreddit.over18 and not allow_nsfw:
-                            continue
-                        if not subreddit.over18 and not allow_sfw:
-                            continue
-                        if search_type == "Search by subreddit name" and keyword not in subreddit.display_name.lower():
-                            continue
-                        results.append((subreddit.display_name, subreddit.title, subreddit.subscribers, subreddit.over18))
-                        self.filter_container.show()
-                        self.detected_type_label.setText("Detected Type: Reddit Subreddit Search")
-
-            results.sort(key=lambda x: x[2], reverse=True)
-
-            for name, title, subs, over18 in results:
-                tag = "🔞" if over18 else "✅"
-                self.subreddit_list.addItem(f"{tag} r/{name} ({subs:,} members) - {title}")
-
-            if not results:
-                self.log("No subreddits found matching your filters.")
-
-        except Exception as e:
-            self.log(f"Error searching subreddits: {e}")
+        # A background refresh replaces the cached list in one go; a streamed one is already shown
+        if set(results) != self.shown_results:
+            self.show_search_results(results)
+        if not results:
+            self.log("No subreddits found matching your filters.")
 
 # --- Utility Functions ---  
     def update_progress(self, current, total):
@@ -0,0 +1,79 @@
+# scheduler.py
+
+import asyncio
+
+class DownloadScheduler:
+    # A fixed pool of workers fed through a bounded queue, so memory grows with the
+    # worker count rather than with the number of URLs submitted.
+    def __init__(self, handler, workers: int, on_done=None, on_error=None, queue_size: int | None = None):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.on_done = on_done
+        self.on_error = on_error
+        self.queue = asyncio.Queue(maxsize=queue_size or self.workers * 2)
+        self.queued = 0
+        self.in_flight = 0
+        self.done = 0
+        self.failed = 0
+        self._progress = asyncio.Event()
+        self._tasks = []
+
+    @property
+    def pending(self) -> int:
+        return self.queued + self.in_flight
+
+    @property
+    def completed(self) -> int:
+        return self.done + self.failed
+
+    def stats(self) -> dict:
+        return {"queued": self.queued, "in_flight": self.in_flight, "done": self.done, "failed": self.failed}
+
+    async def __aenter__(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                await self.queue.join()
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def submit(self, item):
+        # Blocks while the queue is full, which keeps a fast producer in step with the workers
+        self.queued += 1
+        await self.queue.put(item)
+
+    async def wait_for_progress(self):
+        self._progress.clear()
+        await self._progress.wait()
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            self.queued -= 1
+            self.in_flight += 1
+            try:
+                result = await self.handler(item)
+            except Exception as e:
+                self.failed += 1
+                if self.on_error:
+                    self._callback(self.on_error, item, e)
+            else:
+                self.done += 1
+                if self.on_done:
+                    self._callback(self.on_done, item, result)
+            finally:
+                self.in_flight -= 1
+                self.queue.task_done()
+                self._progress.set()
+
+    def _callback(self, callback, item, value):
+        # A failing callback must not take its worker down: with every worker gone, join() never returns
+        try:
+            callback(item, value)
+        except Exception as e:
+            print(f"[ERROR] {getattr(callback, '__name__', 'callback')} failed for {item!r}: {e!r}")
@@ -0,0 +1,26 @@
+# search_cache.py
+
+import time
+from collections import OrderedDict
+
+class SearchCache:
+    # LRU cache whose entries go stale after ttl seconds. Stale entries are still returned
+    # (flagged), so a caller can show them at once and refresh in the background.
+    def __init__(self, max_entries: int = 64, ttl: float = 15 * 60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    def get(self, key) -> tuple[object, bool] | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        stored_at, value = entry
+        return value, time.monotonic() - stored_at < self.ttl
+
+    def put(self, key, value):
+        self.entries[key] = (time.monotonic(), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
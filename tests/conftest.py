@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# The modules live at the repository root rather than in a package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+@pytest.fixture
+def downloads(monkeypatch):
+    # Stands in for the network in reddit_utils: URLs in fail raise, URLs in near raise
+    # NearDuplicate, URLs in hold wait for release, and the rest save at once
+    import asyncio
+    import reddit_utils
+    from phash_index import NearDuplicate
+
+    state = SimpleNamespace(fail=set(), near=set(), hold=set(), release=None, fetched=[])
+
+    async def save_post(session, post, target, **options):
+        state.fetched.append(post.url)
+        if post.url in state.hold:
+            if state.release is None:
+                state.release = asyncio.Event()
+            await state.release.wait()
+        if post.url in state.fail:
+            raise OSError("connection reset")
+        if post.url in state.near:
+            raise NearDuplicate("other.jpg", 2)
+        target.saved_urls.append(post.url)
+        return post.url
+
+    async def get_session():
+        return None
+
+    monkeypatch.setattr(reddit_utils, "save_post", save_post)
+    monkeypatch.setattr(reddit_utils, "get_session", get_session)
+    return state
+
+@pytest.fixture
+def fake_fetch(monkeypatch):
+    # url -> body served by reddit_utils.fetch_image
+    import asyncio
+    import reddit_utils
+
+    bodies = {}
+
+    async def fetch_image(session, url, part_path, hasher=None):
+        await asyncio.sleep(0)
+        part_path.write_bytes(bodies[url])
+        if hasher is not None:
+            hasher.update(bodies[url])
+
+    monkeypatch.setattr(reddit_utils, "fetch_image", fetch_image)
+    return bodies
@@ -0,0 +1,72 @@
+import base64
+import hashlib
+
+import blobstore
+from blobstore import BlobStore, MultiHash, copy_tree, fourchan_md5_hex, link_file
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def test_identical_files_share_one_blob(tmp_path):
+    store = BlobStore(str(tmp_path))
+    first, second = tmp_path / "a.jpg", tmp_path / "b.jpg"
+    first.write_bytes(b"same")
+    second.write_bytes(b"same")
+
+    blob = store.ingest(first, sha256(b"same"))
+    assert store.ingest(second, sha256(b"same")) == blob
+    assert blob == store.blob_path(sha256(b"same"))
+    assert first.read_bytes() == second.read_bytes() == blob.read_bytes() == b"same"
+    assert first.samefile(blob) and second.samefile(blob)
+
+def test_md5_alias_finds_the_blob(tmp_path):
+    store = BlobStore(str(tmp_path))
+    path = tmp_path / "a.jpg"
+    path.write_bytes(b"data")
+    md5_hex = hashlib.md5(b"data").hexdigest()
+    blob = store.ingest(path, sha256(b"data"), md5_hex)
+
+    assert store.find_md5(md5_hex) == blob
+    assert store.find_md5("0" * 32) is None
+    copy = tmp_path / "again.jpg"
+    store.link_into(blob, copy)
+    assert copy.read_bytes() == b"data"
+
+def test_link_file_falls_back_to_copy(tmp_path, monkeypatch):
+    def unsupported(*args):
+        raise OSError("cross-device link")
+    monkeypatch.setattr(blobstore.os, "link", unsupported)
+    monkeypatch.setattr(blobstore, "reflink", unsupported)
+    src, dest = tmp_path / "src", tmp_path / "dest"
+    src.write_bytes(b"payload")
+    dest.write_bytes(b"stale")
+    link_file(src, dest)
+    assert dest.read_bytes() == b"payload"
+
+def test_multihash_and_fourchan_md5():
+    hasher = MultiHash("sha256", "md5")
+    hasher.update(b"abc")
+    hasher.update(b"def")
+    assert hasher.hexdigest() == sha256(b"abcdef")
+    assert hasher.hexdigest("md5") == hashlib.md5(b"abcdef").hexdigest()
+    digest = hashlib.md5(b"x").digest()
+    assert fourchan_md5_hex(base64.b64encode(digest).decode()) == digest.hex()
+
+def test_copy_tree_keeps_links(tmp_path):
+    master = tmp_path / "master"
+    (master / "r_pics").mkdir(parents=True)
+    (master / "r_art").mkdir()
+    store = BlobStore(str(master))
+    for folder in ("r_pics", "r_art"):
+        path = master / folder / "same.jpg"
+        path.write_bytes(b"shared image")
+        store.ingest(path, sha256(b"shared image"))
+    (master / "r_pics" / "own.jpg").write_bytes(b"own")
+
+    copy_tree(str(master), str(tmp_path / "backup"))
+    backup = tmp_path / "backup"
+    blob = backup / store.blob_path(sha256(b"shared image")).relative_to(master)
+    assert blob.read_bytes() == b"shared image"
+    assert (backup / "r_pics" / "same.jpg").samefile(blob)
+    assert (backup / "r_art" / "same.jpg").samefile(blob)
+    assert (backup / "r_pics" / "own.jpg").read_bytes() == b"own"
@@ -0,0 +1,130 @@
+import asyncio
+import json
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import utils
+from manifest import DownloadManifest
+from utils import download_file, get_part_path, get_part_meta_path
+
+BODY = bytes(range(256)) * 40
+ETAG = '"v1"'
+
+class FileServer:
+    # Serves BODY with a strong ETag and honours Range/If-Range unless told to misbehave
+    def __init__(self, body=BODY):
+        self.body = body
+        self.requests = []
+        self.ignore_range = False
+        self.unsatisfiable = False
+        self.range_shift = 0  # moves the start a 206 reports away from the one requested
+
+    async def handle(self, request):
+        self.requests.append(request.headers.copy())
+        headers = {"ETag": ETAG, "Accept-Ranges": "bytes"}
+        if request.headers.get("If-None-Match") == ETAG:
+            return web.Response(status=304, headers=headers)
+        range_header = request.headers.get("Range")
+        if range_header and not self.ignore_range and request.headers.get("If-Range", ETAG) == ETAG:
+            if self.unsatisfiable:
+                return web.Response(status=416, headers={"Content-Range": f"bytes */{len(self.body)}"})
+            start, end = range_header.removeprefix("bytes=").split("-")
+            start = int(start) + self.range_shift
+            end = int(end) if end else len(self.body) - 1
+            chunk = self.body[start:end + 1]
+            headers["Content-Range"] = f"bytes {start}-{start + len(chunk) - 1}/{len(self.body)}"
+            return web.Response(status=206, body=chunk, headers=headers)
+        return web.Response(body=self.body, headers=headers)
+
+def fetch(server, folder, prepare=None, runs=({},)):
+    # One download per entry of runs (download_file keyword arguments), all against the same URL
+    async def main():
+        app = web.Application()
+        app.router.add_get("/file.bin", server.handle)
+        async with TestServer(app) as test_server, aiohttp.ClientSession() as session:
+            url = str(test_server.make_url("/file.bin"))
+            if prepare:
+                prepare(url)
+            for kwargs in runs:
+                path = await download_file(session, url, asyncio.Semaphore(8), folder, **kwargs)
+            return path
+    return asyncio.run(main())
+
+def leave_part(folder, data):
+    # A .part plus its metadata, as an interrupted download leaves them
+    def prepare(url):
+        file_path = folder / "file.bin"
+        get_part_path(file_path).write_bytes(data)
+        get_part_meta_path(file_path).write_text(json.dumps({"url": url, "validator": ETAG}))
+    return prepare
+
+def test_fresh_download(tmp_path):
+    server = FileServer()
+    path = fetch(server, tmp_path)
+    assert path.read_bytes() == BODY
+    assert not get_part_path(path).exists() and not get_part_meta_path(path).exists()
+    # Too small to split, so the size probe is followed by one plain GET
+    assert [headers.get("Range") for headers in server.requests] == ["bytes=0-0", None]
+
+def test_resume_sends_range_and_if_range(tmp_path):
+    server = FileServer()
+    path = fetch(server, tmp_path, leave_part(tmp_path, BODY[:1000]))
+    assert path.read_bytes() == BODY
+    assert len(server.requests) == 1
+    assert server.requests[0]["Range"] == "bytes=1000-"
+    assert server.requests[0]["If-Range"] == ETAG
+
+def test_misaligned_range_restarts(tmp_path):
+    server = FileServer()
+    server.range_shift = -500
+    path = fetch(server, tmp_path, leave_part(tmp_path, BODY[:1000]))
+    assert path.read_bytes() == BODY
+    assert [headers.get("Range") for headers in server.requests] == ["bytes=1000-", None]
+
+def test_unsatisfiable_range_retries_from_scratch(tmp_path):
+    server = FileServer()
+    server.unsatisfiable = True
+    path = fetch(server, tmp_path, leave_part(tmp_path, b"x" * 20000))
+    assert path.read_bytes() == BODY
+    assert [headers.get("Range") for headers in server.requests] == ["bytes=20000-", None]
+
+def test_full_response_to_a_range_restarts(tmp_path):
+    server = FileServer()
+    server.ignore_range = True
+    path = fetch(server, tmp_path, leave_part(tmp_path, b"x" * 1000))
+    assert path.read_bytes() == BODY
+    assert len(server.requests) == 1
+
+def test_manifest_skips_and_revalidates(tmp_path):
+    server = FileServer()
+    manifest = DownloadManifest(tmp_path)
+    path = fetch(server, tmp_path, runs=[
+        {"manifest": manifest},
+        {"manifest": manifest},  # skipped without a request
+        {"manifest": manifest, "revalidate": True},
+    ])
+    (url,) = manifest.entries
+    assert manifest.is_complete(url, path)
+    assert path.read_bytes() == BODY
+    assert [headers.get("Range") for headers in server.requests] == ["bytes=0-0", None, None]
+    assert server.requests[-1]["If-None-Match"] == ETAG
+
+def test_segmented_download_assembles(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "SEGMENT_THRESHOLD", 1000)
+    server = FileServer()
+    path = fetch(server, tmp_path, runs=[{"segments": 4}])
+    assert path.read_bytes() == BODY
+    assert not get_part_path(path).exists()
+    assert server.requests[0]["Range"] == "bytes=0-0"
+    ranges = sorted(headers["Range"] for headers in server.requests[1:])
+    assert ranges == ["bytes=0-2559", "bytes=2560-5119", "bytes=5120-7679", "bytes=7680-10239"]
+    assert all(headers["If-Range"] == ETAG for headers in server.requests[1:])
+
+def test_known_small_files_skip_the_probe(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "SEGMENT_THRESHOLD", len(BODY) + 1)
+    server = FileServer()
+    path = fetch(server, tmp_path, runs=[{"segments": 4, "expected_size": len(BODY)}])
+    assert path.read_bytes() == BODY
+    assert [headers.get("Range") for headers in server.requests] == [None]
@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+from download_index import DownloadIndex, IndexWriter
+
+@pytest.fixture
+def cache(tmp_path):
+    return str(tmp_path / "cache")
+
+def test_downloads_round_trip(cache):
+    index = DownloadIndex(cache, link_log_file=None)
+    index.add("r_pics", "https://i.example/1.jpg", "r_pics_0_1.jpg")
+    index.add_many("r_pics", [("https://i.example/2.jpg", None), ("https://i.example/1.jpg", None)])
+    index.close()
+
+    index = DownloadIndex(cache, link_log_file=None)
+    try:
+        assert index.contains("r_pics", "https://i.example/1.jpg")
+        assert index.contains("r_pics", "https://i.example/2.jpg")
+        assert not index.contains("r_art", "https://i.example/1.jpg")
+    finally:
+        index.close()
+
+def test_clearing_a_source_clears_its_watermarks(cache):
+    index = DownloadIndex(cache, link_log_file=None)
+    try:
+        index.add("r_pics", "https://i.example/1.jpg")
+        index.add("r_art", "https://i.example/1.jpg")
+        index.set_watermark("r_pics", "new", "p1", 1000.0)
+        index.set_watermark("r_art", "new", "a1", 2000.0)
+
+        assert index.clear_source("r_pics") == 1
+        assert not index.contains("r_pics", "https://i.example/1.jpg")
+        assert index.get_watermark("r_pics", "new") is None
+        assert index.get_watermark("r_art", "new") == ("a1", 2000.0)
+
+        assert index.clear_downloads() == 1
+        assert index.get_watermark("r_art", "new") is None
+    finally:
+        index.close()
+
+def test_watermark_round_trip(cache):
+    index = DownloadIndex(cache, link_log_file=None)
+    index.set_watermark("r_pics", "new", "p1", 1000.0)
+    index.set_watermark("r_pics", "new", "p2", 1001.5)
+    index.close()
+
+    index = DownloadIndex(cache, link_log_file=None)
+    try:
+        assert index.get_watermark("r_pics", "new") == ("p2", 1001.5)
+        assert index.get_watermark("r_pics", "top") is None
+    finally:
+        index.close()
+
+def test_subreddit_meta_cache(cache, monkeypatch):
+    index = DownloadIndex(cache, link_log_file=None)
+    try:
+        meta = {"name": "EarthPorn", "title": "Earth", "subscribers": 5, "over18": False}
+        index.put_subreddit_meta({"earthporn": meta, "gone": None})
+        found = index.get_subreddit_meta(["earthporn", "gone", "unknown"], 60)
+        assert found["earthporn"] == meta
+        # Names Reddit didn't return are cached too, with no subscriber count
+        assert found["gone"]["subscribers"] is None
+        assert "unknown" not in found
+
+        later = time.time() + 120
+        monkeypatch.setattr(time, "time", lambda: later)
+        assert index.get_subreddit_meta(["earthporn"], 60) == {}
+    finally:
+        index.close()
+
+def test_link_log_and_legacy_migration(tmp_path, cache):
+    legacy_log = tmp_path / "downloaded_links.log"
+    legacy_log.write_text("[EROME] https://www.erome.com/a/1\n[4chan] https://boards.4chan.org/x/thread/2\n")
+    (tmp_path / "cache").mkdir()
+    (tmp_path / "cache" / "r_pics.txt").write_text("https://i.example/1.jpg\n\nhttps://i.example/2.jpg\n")
+
+    index = DownloadIndex(cache, str(legacy_log))
+    try:
+        assert index.contains("r_pics", "https://i.example/2.jpg")
+        assert (tmp_path / "cache" / "r_pics.txt.migrated").exists()
+        assert not legacy_log.exists()
+        assert index.log_link("motherless", "https://motherless.com/G1")
+        assert not index.log_link("EROME", "https://www.erome.com/a/1")
+        assert index.links() == [
+            ("EROME", "https://www.erome.com/a/1"),
+            ("4CHAN", "https://boards.4chan.org/x/thread/2"),
+            ("MOTHERLESS", "https://motherless.com/G1"),
+        ]
+    finally:
+        index.close()
+
+def test_writer_commits_everything_before_close(cache):
+    index = DownloadIndex(cache, link_log_file=None)
+    try:
+        with IndexWriter(index) as writer:
+            for n in range(1200):
+                writer.add("r_pics" if n % 2 else "r_art", f"https://i.example/{n}.jpg", f"{n}.jpg")
+        assert all(index.contains("r_pics" if n % 2 else "r_art", f"https://i.example/{n}.jpg") for n in range(1200))
+    finally:
+        index.close()
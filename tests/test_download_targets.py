@@ -0,0 +1,46 @@
+import asyncio
+
+from reddit_utils import RedditPost, DownloadTarget, download_to_targets
+
+def post(source, number):
+    return RedditPost(f"{source}{number}", f"https://i.example/{source}/{number}.jpg", 0.0, False, source)
+
+async def listing(posts):
+    for item in posts:
+        yield item
+
+def run(posts, targets, on_saved=None, timeout=5):
+    route = lambda item: targets.get(item.subreddit)
+    return asyncio.run(asyncio.wait_for(
+        download_to_targets(listing(posts), list(targets.values()), route, 4, on_saved=on_saved), timeout
+    ))
+
+def saved(targets):
+    return {source: sorted(target.saved_urls) for source, target in targets.items()}
+
+def test_saturated_target_does_not_stall_the_listing(downloads, tmp_path):
+    targets = {"a": DownloadTarget("a", str(tmp_path), 1), "b": DownloadTarget("b", str(tmp_path), 3)}
+    # a's only allowed download hangs until b has everything it needs, which can only
+    # happen if b's posts behind a's in the listing still get through
+    downloads.hold = {post("a", 1).url}
+    posts = [post("a", n) for n in range(1, 12)] + [post("b", n) for n in range(1, 4)]
+
+    def on_saved(filename, url, count, source):
+        if source == "b" and count == 3:
+            downloads.release.set()
+
+    run(posts, targets, on_saved)
+    assert saved(targets) == {"a": [post("a", 1).url], "b": [post("b", n).url for n in range(1, 4)]}
+
+def test_backlog_replaces_failed_download(downloads, tmp_path):
+    targets = {"a": DownloadTarget("a", str(tmp_path), 2), "b": DownloadTarget("b", str(tmp_path), 1)}
+    downloads.fail = {post("a", 1).url, post("a", 3).url}
+    run([post("a", n) for n in range(1, 6)] + [post("b", 1)], targets)
+    assert saved(targets) == {"a": [post("a", 2).url, post("a", 4).url], "b": [post("b", 1).url]}
+    assert targets["a"].pending == targets["b"].pending == 0
+
+def test_limit_is_exact_without_failures(downloads, tmp_path):
+    targets = {"a": DownloadTarget("a", str(tmp_path), 3)}
+    run([post("a", n) for n in range(1, 20)], targets)
+    assert len(targets["a"].saved_urls) == 3
+    assert len(downloads.fetched) == 3
@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+from download_index import DownloadIndex
+from reddit_utils import lookup_subreddits
+
+class FakeReddit:
+    def __init__(self, missing=()):
+        self.missing = set(missing)
+        self.batches = []
+
+    def info(self, subreddits):
+        self.batches.append(len(subreddits))
+        return [
+            SimpleNamespace(display_name=name.upper(), title=f"{name}!", subscribers=len(name), over18=True)
+            for name in subreddits if name not in self.missing
+        ]
+
+def test_batches_and_caches(tmp_path):
+    names = [f"sub{n}" for n in range(251)]
+    reddit = FakeReddit(missing={"sub7"})
+    index = DownloadIndex(str(tmp_path), link_log_file=None)
+    try:
+        found = lookup_subreddits(reddit, names + ["SUB1"], index)
+        assert reddit.batches == [100, 100, 51]
+        assert found["sub1"] == {"name": "SUB1", "title": "sub1!", "subscribers": 4, "over18": True}
+        assert found["sub7"] is None
+        assert len(found) == 251
+
+        # Every name, including the missing one, now comes from the cache
+        again = lookup_subreddits(reddit, names, index)
+        assert reddit.batches == [100, 100, 51]
+        assert again == found
+    finally:
+        index.close()
+
+def test_without_cache():
+    reddit = FakeReddit()
+    assert lookup_subreddits(reddit, ["a", "b"])["b"]["name"] == "B"
+    assert reddit.batches == [2]
@@ -0,0 +1,75 @@
+import hashlib
+
+from manifest import DownloadManifest, hash_file, MANIFEST_NAME
+
+HEADERS = {"ETag": '"abc"', "Last-Modified": "Tue, 01 Oct 2024 10:00:00 GMT"}
+
+def test_round_trip(tmp_path):
+    file_path = tmp_path / "a.jpg"
+    file_path.write_bytes(b"image bytes")
+    first = DownloadManifest(tmp_path)
+    first.record("https://x.example/a.jpg", file_path, HEADERS, sha256="00ff")
+    first.save()
+
+    second = DownloadManifest(tmp_path)
+    assert second.get("https://x.example/a.jpg") == {
+        "file": "a.jpg", "size": 11, "etag": '"abc"', "last_modified": HEADERS["Last-Modified"], "sha256": "00ff",
+    }
+    assert second.is_complete("https://x.example/a.jpg", file_path)
+    assert second.conditional_headers("https://x.example/a.jpg") == {
+        "If-None-Match": '"abc"', "If-Modified-Since": HEADERS["Last-Modified"],
+    }
+    assert second.conditional_headers("https://x.example/other.jpg") == {}
+
+def test_is_complete_checks_name_and_size(tmp_path):
+    file_path = tmp_path / "a.jpg"
+    file_path.write_bytes(b"image bytes")
+    entries = DownloadManifest(tmp_path)
+    entries.record("https://x.example/a.jpg", file_path)
+
+    assert not entries.is_complete("https://x.example/a.jpg", tmp_path / "b.jpg")
+    file_path.write_bytes(b"truncated")
+    assert not entries.is_complete("https://x.example/a.jpg", file_path)
+    file_path.unlink()
+    assert not entries.is_complete("https://x.example/a.jpg", file_path)
+
+def test_journal_survives_a_missing_save(tmp_path):
+    file_path = tmp_path / "a.jpg"
+    file_path.write_bytes(b"x")
+    entries = DownloadManifest(tmp_path)
+    for n in range(3):
+        entries.record(f"https://x.example/{n}", file_path)
+    assert not (tmp_path / MANIFEST_NAME).exists()
+
+    # No save(), as after a crash: the journal still has every record, torn last line aside
+    with open(entries.journal_path, "a", encoding="utf-8") as f:
+        f.write('["https://x.example/torn", {"fi')
+    reopened = DownloadManifest(tmp_path)
+    assert sorted(reopened.entries) == [f"https://x.example/{n}" for n in range(3)]
+
+    reopened.save()
+    assert not reopened.journal_path.exists()
+    assert len(DownloadManifest(tmp_path).entries) == 3
+
+def test_records_append_instead_of_rewriting(tmp_path):
+    file_path = tmp_path / "a.jpg"
+    file_path.write_bytes(b"x")
+    entries = DownloadManifest(tmp_path)
+    entries.record("https://x.example/0", file_path)
+    entries.save()
+    snapshot = (tmp_path / MANIFEST_NAME).stat().st_mtime_ns
+    for n in range(1, 50):
+        entries.record(f"https://x.example/{n}", file_path)
+    assert (tmp_path / MANIFEST_NAME).stat().st_mtime_ns == snapshot
+    assert len(entries.journal_path.read_text().splitlines()) == 49
+
+def test_corrupt_manifest_starts_empty(tmp_path):
+    (tmp_path / MANIFEST_NAME).write_text("{not json")
+    assert DownloadManifest(tmp_path).entries == {}
+
+def test_hash_file(tmp_path):
+    path = tmp_path / "blob"
+    data = bytes(range(256)) * 1000
+    path.write_bytes(data)
+    assert hash_file(path).hexdigest() == hashlib.sha256(data).hexdigest()
+    assert hash_file(path, "md5").hexdigest() == hashlib.md5(data).hexdigest()
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import utils
+from utils import iter_motherless_urls
+
+GALLERY = "https://motherless.com/GABC123"
+
+def gallery_html(count):
+    links = "".join(f'<a class="media-link" href="/M{n}">{n}</a>' for n in range(count))
+    return f"<html><body>{links}</body></html>"
+
+def media_html(n):
+    return f'<html><body><img id="media-media" src="https://cdn.example/{n}.jpg"></body></html>'
+
+class Site:
+    # Serves fetch_text and the browser crawl; pages listed in http_fail only resolve in the browser,
+    # pages in browser_fail resolve nowhere
+    def __init__(self, count, http_fail=(), browser_fail=(), gallery_ok=True):
+        self.count = count
+        self.http_fail = set(http_fail)
+        self.browser_fail = set(browser_fail)
+        self.gallery_ok = gallery_ok
+        self.browser_pages = None
+
+    async def fetch_text(self, session, url):
+        if url == GALLERY:
+            if not self.gallery_ok:
+                raise utils.DownloadError("HTTP 503")
+            return gallery_html(self.count)
+        n = int(url.rsplit("/M", 1)[1])
+        if n in self.http_fail:
+            raise utils.DownloadError("HTTP 503")
+        return media_html(n)
+
+    async def iter_motherless_media(self, url, workers=4, media_pages=None, on_failed=None):
+        self.browser_pages = media_pages
+        pages = media_pages if media_pages is not None else [f"https://motherless.com/M{n}" for n in range(self.count)]
+        for page in pages:
+            n = int(page.rsplit("/M", 1)[1])
+            if n in self.browser_fail:
+                on_failed(page)
+            else:
+                yield f"https://cdn.example/{n}.jpg"
+
+@pytest.fixture
+def site(monkeypatch):
+    def install(*args, **kwargs):
+        site = Site(*args, **kwargs)
+        monkeypatch.setattr(utils, "fetch_text", site.fetch_text)
+        monkeypatch.setattr(utils, "iter_motherless_media", site.iter_motherless_media)
+        return site
+    return install
+
+def resolve(cache_path, **kwargs):
+    methods = []
+
+    async def main():
+        on_resolved = lambda method, count, seconds: methods.append((method, count))
+        return [src async for src in iter_motherless_urls(None, GALLERY, cache_path, on_resolved, **kwargs)]
+
+    return sorted(asyncio.run(main())), methods
+
+def expected(numbers):
+    return sorted(f"https://cdn.example/{n}.jpg" for n in numbers)
+
+def test_http_resolves_everything(tmp_path, site):
+    fake = site(5)
+    urls, methods = resolve(tmp_path / "cache.json")
+    assert urls == expected(range(5))
+    assert methods == [("http", 5)]
+    assert fake.browser_pages is None
+    assert sorted(json.loads((tmp_path / "cache.json").read_text())["urls"]) == urls
+
+def test_browser_only_retries_unresolved_pages(tmp_path, site):
+    fake = site(6, http_fail={1, 4})
+    urls, methods = resolve(tmp_path / "cache.json")
+    assert urls == expected(range(6))
+    assert sorted(fake.browser_pages) == ["https://motherless.com/M1", "https://motherless.com/M4"]
+    assert methods == [("http", 4), ("browser", 2)]
+    assert (tmp_path / "cache.json").exists()
+
+def test_partial_resolution_is_not_cached(tmp_path, site):
+    site(6, http_fail={1, 4}, browser_fail={4})
+    urls, _ = resolve(tmp_path / "cache.json")
+    assert urls == expected([0, 1, 2, 3, 5])
+    assert not (tmp_path / "cache.json").exists()
+
+    # The next run starts over and picks the missing item up once it resolves
+    site(6, http_fail={1, 4})
+    urls, methods = resolve(tmp_path / "cache.json")
+    assert urls == expected(range(6))
+    assert methods[0] == ("http", 4)
+
+def test_unreachable_gallery_falls_back_to_full_crawl(tmp_path, site):
+    fake = site(3, gallery_ok=False)
+    urls, methods = resolve(tmp_path / "cache.json")
+    assert urls == expected(range(3))
+    assert fake.browser_pages is None
+    assert methods == [("http", 0), ("browser", 3)]
+
+def test_cache_is_used_until_it_expires(tmp_path, site):
+    cache_path = tmp_path / "cache.json"
+    site(3)
+    resolve(cache_path)
+    site(4)
+    urls, methods = resolve(cache_path)
+    assert methods == [("cache", 3)]
+
+    data = json.loads(cache_path.read_text())
+    data["resolved_at"] = time.time() - 3600
+    cache_path.write_text(json.dumps(data))
+    urls, methods = resolve(cache_path, max_age=60)
+    assert urls == expected(range(4))
+    assert methods == [("http", 4)]
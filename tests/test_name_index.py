@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from name_index import NameIndex, INDEX_SUFFIX
+
+NAMES = ["/r/CatPics", "bigcats", "dogs", "catsanddogs", "# a comment", "", "cat", "bigcats"]
+
+@pytest.fixture
+def names_file(tmp_path):
+    path = tmp_path / "known_nsfw.txt"
+    path.write_text("\n".join(NAMES) + "\n", encoding="utf-8")
+    return str(path)
+
+def brute_force(text):
+    names = sorted({name.replace("/r/", "").lower() for name in NAMES if name and not name.startswith("#")})
+    return [name for name in names if text in name]
+
+@pytest.mark.parametrize("text", ["cat", "cats", "dogs", "c", "", "pics", "zzz", "sanddo"])
+def test_search_matches_substring_scan(names_file, text):
+    assert NameIndex(names_file).search(text) == brute_force(text)
+
+def test_prefix_and_suggest(names_file):
+    index = NameIndex(names_file)
+    assert index.prefix("cat") == ["cat", "catpics", "catsanddogs"]
+    assert index.prefix("cat", limit=1) == ["cat"]
+    # Prefix matches first, then names that only contain the text
+    assert index.suggest("cat", limit=4) == ["cat", "catpics", "catsanddogs", "bigcats"]
+    assert index.suggest("CAT", limit=2) == ["cat", "catpics"]
+
+def test_index_is_cached_and_rebuilt_on_change(names_file):
+    NameIndex(names_file)
+    assert os.path.exists(names_file + INDEX_SUFFIX)
+
+    with open(names_file, "a", encoding="utf-8") as f:
+        f.write("catnip\n")
+    stat = os.stat(names_file)
+    os.utime(names_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    index = NameIndex(names_file)
+    assert "catnip" in index.search("cat")
+
+def test_missing_file_is_empty(tmp_path):
+    index = NameIndex(str(tmp_path / "missing.txt"))
+    assert index.search("cat") == []
+    assert index.suggest("cat") == []
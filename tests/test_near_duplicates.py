@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+
+pytest.importorskip("PIL")
+from PIL import Image
+
+from phash_index import PHashIndex, NearDuplicate
+from reddit_utils import RedditPost, DownloadTarget, save_post
+
+@pytest.fixture
+def gradient(tmp_path):
+    path = tmp_path / "source.png"
+    Image.linear_gradient("L").resize((64, 64)).save(path)
+    return path.read_bytes()
+
+@pytest.fixture
+def phash_index(tmp_path):
+    index = PHashIndex(str(tmp_path / "cache"), workers=1)
+    yield index
+    index.close()
+
+def post(number):
+    return RedditPost(f"p{number}", f"https://i.example/{number}.png", 0.0, False, "pics")
+
+def save_all(posts, target, **options):
+    async def main():
+        return await asyncio.gather(*(save_post(None, item, target, **options) for item in posts), return_exceptions=True)
+    return asyncio.run(main())
+
+def test_concurrent_copies_are_skipped(tmp_path, gradient, phash_index, fake_fetch):
+    posts = [post(n) for n in range(4)]
+    for item in posts:
+        fake_fetch[item.url] = gradient
+    folder = tmp_path / "r_pics"
+    folder.mkdir()
+    target = DownloadTarget("r_pics", str(folder), None)
+
+    results = save_all(posts, target, phash_index=phash_index, skip_near_duplicates=True)
+    saved = [result for result in results if isinstance(result, str)]
+    assert len(saved) == 1
+    assert all(isinstance(result, NearDuplicate) for result in results if result not in saved)
+    # The skipped copies leave no .part files behind
+    assert [str(path) for path in folder.iterdir()] == saved
+
+def test_flag_mode_keeps_copies_and_reports_them(tmp_path, gradient, phash_index, fake_fetch):
+    posts = [post(n) for n in range(3)]
+    for item in posts:
+        fake_fetch[item.url] = gradient
+    target = DownloadTarget("r_pics", str(tmp_path), None)
+    flagged = []
+
+    results = save_all(posts, target, phash_index=phash_index,
+                       on_near_duplicate=lambda url, filename, match, distance: flagged.append((url, distance)))
+    assert all(isinstance(result, str) for result in results)
+    assert len(target.saved_urls) == 3
+    assert len(flagged) == 2 and all(distance == 0 for _, distance in flagged)
+    assert phash_index.tree.size == 3
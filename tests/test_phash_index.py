@@ -0,0 +1,51 @@
+import random
+
+from phash_index import BKTree, PHashIndex, hamming, to_signed, to_unsigned
+
+def test_bktree_matches_brute_force():
+    rng = random.Random(7)
+    values = [rng.getrandbits(64) for _ in range(500)]
+    # Near copies of a few values, so small radii have something to find
+    values += [value ^ (1 << rng.randrange(64)) for value in values[:50]]
+    tree = BKTree()
+    for n, value in enumerate(values):
+        tree.add(value, n)
+    assert tree.size == len(values)
+
+    for query in values[:20] + [rng.getrandbits(64) for _ in range(5)]:
+        for radius in (0, 1, 5, 20):
+            expected = sorted((hamming(query, value), n) for n, value in enumerate(values) if hamming(query, value) <= radius)
+            found = tree.query(query, radius)
+            assert sorted(found) == expected
+            assert [distance for distance, _ in found] == sorted(distance for distance, _ in found)
+
+def test_empty_tree():
+    assert BKTree().query(123, 64) == []
+
+def test_signed_round_trip():
+    for value in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+        signed = to_signed(value)
+        assert -(1 << 63) <= signed < 1 << 63
+        assert to_unsigned(signed) == value
+
+def test_index_persists_hashes(tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    first = images / "a.jpg"
+    first.write_bytes(b"a")
+    value = (1 << 64) - 3  # needs the signed conversion to fit SQLite
+
+    index = PHashIndex(str(tmp_path / "cache"), radius=2)
+    index.add(str(first), value)
+    index.close()
+
+    index = PHashIndex(str(tmp_path / "cache"), radius=2)
+    try:
+        assert index.find(value ^ 0b11) == (2, str(first))
+        assert index.find(value ^ 0b111) is None
+        assert index.find(value, exclude=str(first)) is None
+        first.unlink()
+        # Files deleted since they were indexed never count as matches
+        assert index.find(value) is None
+    finally:
+        index.close()
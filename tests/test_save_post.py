@@ -0,0 +1,26 @@
+import asyncio
+import hashlib
+
+from blobstore import BlobStore
+from reddit_utils import RedditPost, DownloadTarget, save_post
+
+def test_concurrent_saves_get_distinct_numbers_and_share_blobs(tmp_path, fake_fetch):
+    posts = [RedditPost(f"p{n}", f"https://i.example/{n}.jpg", 0.0, False, "pics") for n in range(6)]
+    for n, item in enumerate(posts):
+        fake_fetch[item.url] = b"same" if n % 2 else f"body {n}".encode()
+    folder = tmp_path / "r_pics"
+    folder.mkdir()
+    target = DownloadTarget("r_pics", str(folder), None)
+    blob_store = BlobStore(str(tmp_path))
+
+    async def main():
+        return await asyncio.gather(*(save_post(None, item, target, blob_store=blob_store) for item in posts))
+
+    filenames = asyncio.run(main())
+    numbers = sorted(int(name.rsplit("_", 2)[1]) for name in filenames)
+    assert numbers == list(range(6))
+    assert sorted(target.saved_urls) == sorted(item.url for item in posts)
+    # Four distinct bodies, four blobs; every saved file still reads back its own bytes
+    for n, item in enumerate(posts):
+        assert blob_store.blob_path(hashlib.sha256(fake_fetch[item.url]).hexdigest()).exists()
+    assert sorted(p.read_bytes() for p in folder.iterdir()) == sorted(fake_fetch.values())
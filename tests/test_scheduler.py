@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from scheduler import DownloadScheduler
+
+async def double(item):
+    if item < 0:
+        raise ValueError(item)
+    return item * 2
+
+def run(coro, timeout=5):
+    return asyncio.run(asyncio.wait_for(coro, timeout))
+
+def test_results_and_failures_are_counted():
+    done, errors = {}, {}
+
+    async def main():
+        async with DownloadScheduler(double, 3, on_done=done.__setitem__, on_error=errors.__setitem__) as scheduler:
+            for item in (1, 2, -3, 4):
+                await scheduler.submit(item)
+        return scheduler
+
+    scheduler = run(main())
+    assert done == {1: 2, 2: 4, 4: 8}
+    assert list(errors) == [-3] and isinstance(errors[-3], ValueError)
+    assert scheduler.stats() == {"queued": 0, "in_flight": 0, "done": 3, "failed": 1}
+
+@pytest.mark.parametrize("items", [[1, 2, 3, 4, 5], [-1, -2, -3, -4, -5]])
+def test_raising_callback_does_not_hang(items):
+    calls = []
+
+    def explode(item, value):
+        calls.append(item)
+        raise RuntimeError("callback bug")
+
+    async def main():
+        # One worker, so a dead worker would leave the rest of the queue stranded
+        async with DownloadScheduler(double, 1, on_done=explode, on_error=explode) as scheduler:
+            for item in items:
+                await scheduler.submit(item)
+        return scheduler
+
+    scheduler = run(main())
+    assert calls == items
+    assert scheduler.completed == len(items)
+
+def test_wait_for_progress_wakes_on_completion():
+    async def main():
+        gate = asyncio.Event()
+
+        async def handler(item):
+            await gate.wait()
+
+        async with DownloadScheduler(handler, 1, queue_size=1) as scheduler:
+            await scheduler.submit(1)
+            waiter = asyncio.create_task(scheduler.wait_for_progress())
+            await asyncio.sleep(0)
+            assert not waiter.done()
+            gate.set()
+            await waiter
+        return scheduler
+
+    assert run(main()).done == 1
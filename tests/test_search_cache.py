@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+
+import search_cache
+from search_cache import SearchCache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_fresh_then_stale(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(search_cache, "time", SimpleNamespace(monotonic=clock))
+    cache = SearchCache(ttl=60)
+    assert cache.get("cats") is None
+
+    cache.put("cats", ["a"])
+    assert cache.get("cats") == (["a"], True)
+    clock.now += 61
+    # Stale entries are still served, flagged for a background refresh
+    assert cache.get("cats") == (["a"], False)
+    cache.put("cats", ["a", "b"])
+    assert cache.get("cats") == (["a", "b"], True)
+
+def test_least_recently_used_is_evicted():
+    cache = SearchCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == (1, True)
+    assert cache.get("c") == (3, True)
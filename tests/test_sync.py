@@ -0,0 +1,71 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from download_index import DownloadIndex
+from reddit_utils import sync_subreddit
+
+def submission(number):
+    # Higher numbers are newer, matching the "new" listing's order when listed in reverse
+    return SimpleNamespace(id=f"p{number}", url=f"https://i.example/{number}.jpg", created_utc=1000.0 + number,
+                           over_18=False, subreddit=SimpleNamespace(display_name="pics"))
+
+class FakeSubreddit:
+    def __init__(self, numbers):
+        self.posts = [submission(n) for n in sorted(numbers, reverse=True)]
+        self.listed = []
+
+    def new(self, limit=None):
+        for post in self.posts:
+            self.listed.append(post.id)
+            yield post
+
+@pytest.fixture
+def index(tmp_path):
+    index = DownloadIndex(str(tmp_path / "cache"), link_log_file=None)
+    yield index
+    index.close()
+
+def sync(subreddit, index, tmp_path, limit=None, **options):
+    def on_saved(filename, url, count):
+        index.add("r_pics", url, filename)
+    return asyncio.run(sync_subreddit(subreddit, "r_pics", str(tmp_path), index, limit, on_saved=on_saved, **options))
+
+def test_watermark_stops_the_next_sync(index, downloads, tmp_path):
+    assert len(sync(FakeSubreddit(range(1, 6)), index, tmp_path)) == 5
+    assert index.get_watermark("r_pics", "new") == ("p5", 1005.0)
+
+    subreddit = FakeSubreddit(range(1, 8))
+    assert sorted(sync(subreddit, index, tmp_path)) == ["https://i.example/6.jpg", "https://i.example/7.jpg"]
+    assert subreddit.listed == ["p7", "p6", "p5"]
+    assert index.get_watermark("r_pics", "new") == ("p7", 1007.0)
+
+def test_limit_leaves_watermark_in_place(index, downloads, tmp_path):
+    sync(FakeSubreddit(range(1, 11)), index, tmp_path, limit=3)
+    assert index.get_watermark("r_pics", "new") is None
+
+def test_failed_download_holds_watermark_back(index, downloads, tmp_path):
+    downloads.fail = {"https://i.example/4.jpg", "https://i.example/6.jpg"}
+    errors = []
+    sync(FakeSubreddit(range(1, 9)), index, tmp_path, on_error=lambda url, error: errors.append(url))
+    assert sorted(errors) == sorted(downloads.fail)
+    # Just below the oldest failure, so the next run lists it again
+    assert index.get_watermark("r_pics", "new") == ("p3", 1003.0)
+
+    downloads.fail = set()
+    downloads.fetched = []
+    sync(FakeSubreddit(range(1, 9)), index, tmp_path)
+    assert sorted(downloads.fetched) == ["https://i.example/4.jpg", "https://i.example/6.jpg"]
+    assert index.get_watermark("r_pics", "new") == ("p8", 1008.0)
+
+def test_failure_of_oldest_post_keeps_previous_watermark(index, downloads, tmp_path):
+    index.set_watermark("r_pics", "new", "p2", 1002.0)
+    downloads.fail = {"https://i.example/3.jpg"}
+    sync(FakeSubreddit(range(1, 6)), index, tmp_path)
+    assert index.get_watermark("r_pics", "new") == ("p2", 1002.0)
+
+def test_near_duplicates_do_not_hold_watermark_back(index, downloads, tmp_path):
+    downloads.near = {"https://i.example/2.jpg"}
+    sync(FakeSubreddit(range(1, 4)), index, tmp_path)
+    assert index.get_watermark("r_pics", "new") == ("p3", 1003.0)
@@ -0,0 +1,57 @@
+import asyncio
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+
+from utils import write_stream
+
+class FakeResponse:
+    def __init__(self, chunks, content_length=None):
+        self.content_length = content_length
+
+        async def iter_any():
+            for chunk in chunks:
+                yield chunk
+        self.content = SimpleNamespace(iter_any=iter_any)
+
+CHUNKS = [bytes([n]) * length for n, length in enumerate([10, 3000, 1, 70000, 500, 4096])]
+BODY = b"".join(CHUNKS)
+
+@pytest.mark.parametrize("content_length", [None, len(BODY), 100, 0])
+def test_body_is_written_whole(tmp_path, content_length):
+    # 100 stands in for a Content-Length that undercounts a decompressed body
+    path = tmp_path / "file.part"
+    hasher = hashlib.sha256()
+    progress = SimpleNamespace(total=0)
+    progress.update = lambda n: setattr(progress, "total", progress.total + n)
+
+    written = asyncio.run(write_stream(FakeResponse(CHUNKS, content_length), path, progress, hasher=hasher))
+    assert written == len(BODY) == progress.total
+    assert path.read_bytes() == BODY
+    assert hasher.hexdigest() == hashlib.sha256(BODY).hexdigest()
+
+def test_append_and_offset(tmp_path):
+    path = tmp_path / "file.part"
+    path.write_bytes(b"head-")
+    asyncio.run(write_stream(FakeResponse([b"tail"], 4), path, append=True))
+    assert path.read_bytes() == b"head-tail"
+
+    asyncio.run(write_stream(FakeResponse([b"HEAD"], 4), path, offset=0))
+    assert path.read_bytes() == b"HEAD-tail"
+
+def test_buffered_bytes_reach_disk_when_the_stream_fails(tmp_path):
+    class DroppedResponse(FakeResponse):
+        def __init__(self):
+            super().__init__([], 3_000_000)
+
+            async def iter_any():
+                yield b"a" * 600_000
+                yield b"b" * 400_000
+                raise ConnectionResetError("peer went away")
+            self.content = SimpleNamespace(iter_any=iter_any)
+
+    path = tmp_path / "file.part"
+    with pytest.raises(ConnectionResetError):
+        asyncio.run(write_stream(DroppedResponse(), path))
+    assert path.read_bytes() == b"a" * 600_000 + b"b" * 400_000
@@ -2,22 +2,39 @@
 
 import os
 import re
+import json
+import time
 from pathlib import Path
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urljoin
 from bs4 import BeautifulSoup
 import aiohttp
 import aiofiles
 import asyncio
-from tqdm.asyncio import tqdm, tqdm_asyncio
-from playwright.async_api import async_playwright
+from tqdm.asyncio import tqdm
+from browser_service import get_browser_service
+from manifest import DownloadManifest, hash_file
+from blobstore import BlobStore, MultiHash
+from background_loop import get_session
 
 # Constants
 USER_AGENT = "Mozilla/5.0"
-EROME_HOST = "www.erome.com"
+EROME_CONNECTIONS = 5
 CHUNK_SIZE = 1024
+WRITE_BUFFER_SIZE = 4 * 1024 * 1024
+PART_SUFFIX = ".part"
+PART_META_SUFFIX = ".part.json"
+SEGMENT_THRESHOLD = 64 * 1024 * 1024
+SEGMENT_COUNT = 4
+MOTHERLESS_PAGE_WORKERS = 4
+MOTHERLESS_HTTP_WORKERS = 8
+MOTHERLESS_CACHE_NAME = ".motherless_media.json"
+MOTHERLESS_CACHE_TTL = 24 * 60 * 60  # galleries gain items, so a cached resolution is re-checked daily
+# Media pages only need their DOM; everything else is load time spent on nothing
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}
+TRACKER_HOST_PARTS = ("google-analytics", "googletagmanager", "doubleclick", "exoclick", "juicyads", "trafficjunky")
 
-USER_AGENT = "Mozilla/5.0"
-CHUNK_SIZE = 1024
+class DownloadError(Exception):
+    pass
 
 def clean_album_title(title: str, default_title="temp") -> str:
     illegal_chars = r'[\\/:*?"<>|]'
@@ -29,93 +46,268 @@ def create_download_path(master_folder: str, album_title: str) -> Path:
     path.mkdir(parents=True, exist_ok=True)
     return path
 
-def get_final_download_path(master_folder: str, album_title: str) -> Path:
-    final_path = Path(master_folder) / album_title
-    final_path.mkdir(parents=True, exist_ok=True)
-    return final_path
+def get_part_path(file_path: Path) -> Path:
+    return file_path.with_name(file_path.name + PART_SUFFIX)
 
-async def download_file(session: aiohttp.ClientSession, url: str, semaphore: asyncio.Semaphore, download_path: Path):
-    async with semaphore:
-        async with session.get(url) as r:
-            if r.ok:
-                file_name = Path(urlparse(url).path).name
-                file_path = download_path / file_name
-                total_size = int(r.headers.get("content-length", 0))
-                if file_path.exists() and abs(file_path.stat().st_size - total_size) <= 50:
-                    tqdm.write(f"[#] Skipping {url} [already downloaded]")
-                    return
-                progress = tqdm(desc=f"[+] Downloading {url}", total=total_size, unit="B", unit_scale=True, unit_divisor=CHUNK_SIZE, colour="MAGENTA", leave=False)
-                async with aiofiles.open(file_path, "wb") as f:
-                    async for chunk in r.content.iter_chunked(CHUNK_SIZE):
-                        written = await f.write(chunk)
-                        progress.update(written)
-                progress.close()
-            else:
-                tqdm.write(f"[ERROR] Failed to download {url}")
-
-async def dump_album(url: str, max_connections: int, skip_videos: bool, skip_images: bool, master_folder: str):
-    if urlparse(url).hostname != EROME_HOST:
-        raise ValueError(f"Host must be {EROME_HOST}")
-    title, urls = await collect_album_data(url, skip_videos, skip_images)
-    download_path = get_final_download_path(master_folder, title)
-    await download_album_files(url, urls, max_connections, download_path)
-
-async def collect_album_data(url: str, skip_videos: bool, skip_images: bool) -> tuple[str, list[str]]:
-    headers = {"User-Agent": USER_AGENT}
-    async with aiohttp.ClientSession(headers=headers) as session:
-        async with session.get(url) as response:
-            soup = BeautifulSoup(await response.text(), "html.parser")
-            title = clean_album_title(soup.find("meta", property="og:title")["content"])
-            videos = [v["src"] for v in soup.find_all("source")] if not skip_videos else []
-            images = [i["data-src"] for i in soup.find_all("img", class_="img-back")] if not skip_images else []
-        return title, list(set(videos + images))
-
-async def download_album_files(album: str, urls: list[str], max_connections: int, download_path: Path):
-    semaphore = asyncio.Semaphore(max_connections)
-    async with aiohttp.ClientSession(headers={"Referer": album, "User-Agent": USER_AGENT}, timeout=aiohttp.ClientTimeout(total=None)) as session:
-        tasks = [
-            download_file(session, url, semaphore, download_path)
-            for url in urls
-        ]
-        await tqdm_asyncio.gather(*tasks, colour="MAGENTA", desc="Album Progress", unit="file", leave=True)
-
-
-async def scrape_erome_album(url: str, skip_videos: bool, skip_images: bool) -> tuple[str, list[str]]:
-    headers = {"User-Agent": USER_AGENT}
-    async with aiohttp.ClientSession(headers=headers) as session:
-        async with session.get(url) as response:
-            soup = BeautifulSoup(await response.text(), "html.parser")
-            title = clean_album_title(soup.find("meta", property="og:title")["content"])
-            videos = [v["src"] for v in soup.find_all("source")] if not skip_videos else []
-            images = [i["data-src"] for i in soup.find_all("img", class_="img-back")] if not skip_images else []
-        return title, list(set(videos + images))
-
-async def fetch_4chan_thread_data(board: str, thread_id: str) -> dict:
+def get_part_meta_path(file_path: Path) -> Path:
+    return file_path.with_name(file_path.name + PART_META_SUFFIX)
+
+def get_resume_validator(headers) -> str | None:
+    # If-Range only accepts strong ETags; fall back to Last-Modified otherwise
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+def save_part_meta(file_path: Path, url: str, validator: str):
+    with open(get_part_meta_path(file_path), "w") as f:
+        json.dump({"url": url, "validator": validator}, f)
+
+def discard_part(file_path: Path):
+    get_part_path(file_path).unlink(missing_ok=True)
+    get_part_meta_path(file_path).unlink(missing_ok=True)
+
+def get_resume_headers(file_path: Path, url: str) -> tuple[int, dict]:
+    part_path = get_part_path(file_path)
+    meta_path = get_part_meta_path(file_path)
+    if not part_path.exists() or not meta_path.exists():
+        return 0, {}
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return 0, {}
+    offset = part_path.stat().st_size
+    if meta.get("url") != url or not meta.get("validator") or offset == 0:
+        return 0, {}
+    return offset, {"Range": f"bytes={offset}-", "If-Range": meta["validator"]}
+
+def get_total_size(response: aiohttp.ClientResponse) -> int:
+    # A 206 carries the full length in Content-Range ("bytes 100-999/1000")
+    content_range = response.headers.get("Content-Range", "")
+    if response.status == 206 and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        if total.isdigit():
+            return int(total)
+    return int(response.headers.get("content-length", 0))
+
+def get_range_start(response: aiohttp.ClientResponse) -> int | None:
+    # First byte a 206 carries; None when Content-Range is missing or unreadable
+    content_range = response.headers.get("Content-Range", "")
+    unit, _, byte_range = content_range.partition(" ")
+    start = byte_range.split("-", 1)[0]
+    return int(start) if unit == "bytes" and start.isdigit() else None
+
+# Every download path goes through this writer so no file is ever held in memory whole.
+# Network reads are gathered into one reused buffer and written (and reported) a block at a time.
+# The buffer is no bigger than the body, so a 200 KB image doesn't cost a 4 MiB allocation.
+async def write_stream(response: aiohttp.ClientResponse, part_path: Path, progress=None, append=False, offset=None, hasher=None) -> int:
+    written = 0
+    filled = 0
+    size = max(1, min(response.content_length or WRITE_BUFFER_SIZE, WRITE_BUFFER_SIZE))
+    buffer = memoryview(bytearray(size))
+    mode = "r+b" if offset is not None else "ab" if append else "wb"
+    async with aiofiles.open(part_path, mode) as f:
+        if offset is not None:
+            await f.seek(offset)
+
+        async def flush(block):
+            nonlocal written
+            await f.write(block)
+            if hasher:
+                hasher.update(block)
+            written += len(block)
+            if progress:
+                progress.update(len(block))
+
+        try:
+            # Content-Length can undercount (compressed bodies), so the buffer still flushes when full
+            async for chunk in response.content.iter_any():
+                if filled + len(chunk) > size:
+                    await flush(buffer[:filled])
+                    filled = 0
+                if len(chunk) >= size:
+                    await flush(chunk)
+                    continue
+                buffer[filled:filled + len(chunk)] = chunk
+                filled += len(chunk)
+        finally:
+            # Also on a dropped connection: whatever arrived is on disk for the next resume
+            if filled:
+                await flush(buffer[:filled])
+    return written
+
+async def stream_to_file(response: aiohttp.ClientResponse, file_path: Path, progress=None, append=False, keep_partial=False, hasher=None) -> int:
+    part_path = get_part_path(file_path)
+    try:
+        written = await write_stream(response, part_path, progress, append, hasher=hasher)
+    except BaseException:
+        if not keep_partial:
+            part_path.unlink(missing_ok=True)
+        raise
+    os.replace(part_path, file_path)
+    get_part_meta_path(file_path).unlink(missing_ok=True)
+    return written
+
+async def fetch_4chan_thread_data(board: str, thread_id: str, session: aiohttp.ClientSession | None = None) -> dict:
     api_url = f"https://a.4cdn.org/{board}/thread/{thread_id}.json"
-    async with aiohttp.ClientSession() as session:
-        async with session.get(api_url) as resp:
-            if resp.status != 200:
-                raise ValueError("Failed to fetch thread data.")
-            return await resp.json()
+    session = session or await get_session()
+    async with session.get(api_url) as resp:
+        if resp.status != 200:
+            raise ValueError("Failed to fetch thread data.")
+        return await resp.json()
+
+async def store_download(file_path: Path, url: str, sha256: str, response_headers, manifest: DownloadManifest | None, blob_store: BlobStore | None, md5_hex: str | None = None):
+    if blob_store is not None:
+        # A rename and a link, or a full copy where links aren't supported: off the shared loop either way
+        await asyncio.to_thread(blob_store.ingest, file_path, sha256, md5_hex)
+    if manifest is not None:
+        await asyncio.to_thread(manifest.record, url, file_path, response_headers, sha256)
 
-async def download_file(session: aiohttp.ClientSession, url: str, semaphore: asyncio.Semaphore, download_path: Path):
+def split_ranges(total_size: int, segments: int) -> list[tuple[int, int]]:
+    step = -(-total_size // segments)
+    return [(start, min(start + step, total_size) - 1) for start in range(0, total_size, step)]
+
+async def download_segment(session: aiohttp.ClientSession, url: str, part_path: Path, start: int, end: int, validator: str | None, semaphore: asyncio.Semaphore, progress=None, request_headers=None) -> int:
+    headers = {**(request_headers or {}), "Range": f"bytes={start}-{end}"}
+    if validator:
+        headers["If-Range"] = validator
     async with semaphore:
-        async with session.get(url) as r:
-            if r.ok:
-                file_name = Path(urlparse(url).path).name
-                file_path = download_path / file_name
-                total_size = int(r.headers.get("content-length", 0))
-                if file_path.exists() and abs(file_path.stat().st_size - total_size) <= 50:
-                    tqdm.write(f"[#] Skipping {url} [already downloaded]")
-                    return
-                progress = tqdm(desc=f"[+] Downloading {url}", total=total_size, unit="B", unit_scale=True, unit_divisor=CHUNK_SIZE, colour="MAGENTA", leave=False)
-                async with aiofiles.open(file_path, "wb") as f:
-                    async for chunk in r.content.iter_chunked(CHUNK_SIZE):
-                        written = await f.write(chunk)
-                        progress.update(written)
-                progress.close()
-            else:
-                tqdm.write(f"[ERROR] Failed to download {url}")
+        async with session.get(url, headers=headers) as r:
+            if r.status != 206:
+                raise ValueError(f"expected 206 for bytes {start}-{end}, got {r.status}")
+            written = await write_stream(r, part_path, progress, offset=start)
+    if written != end - start + 1:
+        raise ValueError(f"segment {start}-{end} is {written} bytes, expected {end - start + 1}")
+    return written
+
+async def download_segmented(session: aiohttp.ClientSession, url: str, file_path: Path, total_size: int, validator: str | None, semaphore: asyncio.Semaphore, segments: int, request_headers=None):
+    part_path = get_part_path(file_path)
+    discard_part(file_path)
+    # Preallocate so each segment writes at its own offset through its own handle
+    async with aiofiles.open(part_path, "wb") as f:
+        await f.truncate(total_size)
+
+    progress = tqdm(desc=f"[+] Downloading {url} ({segments} segments)", total=total_size, unit="B", unit_scale=True, unit_divisor=CHUNK_SIZE, colour="MAGENTA", leave=False)
+    try:
+        written = await asyncio.gather(*[
+            download_segment(session, url, part_path, start, end, validator, semaphore, progress, request_headers)
+            for start, end in split_ranges(total_size, segments)
+        ])
+        if sum(written) != total_size or part_path.stat().st_size != total_size:
+            raise ValueError(f"assembled {sum(written)} bytes, expected {total_size}")
+    except Exception as e:
+        part_path.unlink(missing_ok=True)
+        raise DownloadError(f"segmented download failed: {e}") from e
+    finally:
+        progress.close()
+    os.replace(part_path, file_path)
+    return file_path
+
+async def probe_download(session: aiohttp.ClientSession, url: str, request_headers=None) -> tuple[int, str | None, dict] | None:
+    # One byte is enough: a 206 carries the full size in Content-Range and proves ranges work.
+    # Returns (total size, validator, headers), or None when the server doesn't honour the range.
+    async with session.get(url, headers={**(request_headers or {}), "Range": "bytes=0-0"}) as r:
+        if r.status != 206 or get_range_start(r) != 0:
+            return None
+        return get_total_size(r), get_resume_validator(r.headers), r.headers.copy()
+
+async def skip_downloaded(file_path: Path, url: str, total_size: int, response_headers, manifest: DownloadManifest | None) -> bool:
+    if not file_path.exists() or abs(file_path.stat().st_size - total_size) > 50:
+        return False
+    tqdm.write(f"[#] Skipping {url} [already downloaded]")
+    if manifest is not None:
+        await asyncio.to_thread(manifest.record, url, file_path, response_headers)
+    return True
+
+def new_hasher(md5_hex: str | None):
+    # MD5 is only worth computing when there is an expected digest to check it against
+    return MultiHash("sha256", "md5") if md5_hex else MultiHash("sha256")
+
+async def finish_download(file_path: Path, url: str, hasher, response_headers, manifest: DownloadManifest | None, blob_store: BlobStore | None,
+                    expected_size: int | None = None, md5_hex: str | None = None):
+    size = file_path.stat().st_size
+    if expected_size is not None and size != expected_size:
+        file_path.unlink()
+        raise DownloadError(f"got {size} bytes, expected {expected_size}")
+    # Only alias the blob under the source's MD5 if the bytes actually match it
+    verified_md5 = md5_hex if md5_hex and md5_hex == hasher.hexdigest("md5") else None
+    await store_download(file_path, url, hasher.hexdigest(), response_headers, manifest, blob_store, verified_md5)
+
+async def download_file(session: aiohttp.ClientSession, url: str, semaphore: asyncio.Semaphore, download_path: Path,
+                        segments: int = SEGMENT_COUNT, manifest: DownloadManifest | None = None, revalidate: bool = False,
+                        blob_store: BlobStore | None = None, file_name: str | None = None, request_headers: dict | None = None,
+                        expected_size: int | None = None, md5_hex: str | None = None):
+    file_path = download_path / (file_name or Path(urlparse(url).path).name)
+    known = manifest is not None and manifest.is_complete(url, file_path)
+    if known and not revalidate:
+        tqdm.write(f"[#] Skipping {url} [in manifest]")
+        return file_path
+
+    async with semaphore:
+        probe = None
+        # Fresh downloads that could be large ask for their size first; resumes and revalidations don't
+        could_segment = segments > 1 and (expected_size or SEGMENT_THRESHOLD) >= SEGMENT_THRESHOLD
+        if could_segment and not known and not get_resume_headers(file_path, url)[0]:
+            probe = await probe_download(session, url, request_headers)
+        segmented = probe is not None and probe[0] >= SEGMENT_THRESHOLD
+        if segmented:
+            total_size, validator, response_headers = probe
+            if await skip_downloaded(file_path, url, total_size, response_headers, manifest):
+                return file_path
+        while not segmented:
+            offset, headers = get_resume_headers(file_path, url)
+            if known and not offset:
+                headers = manifest.conditional_headers(url)
+            async with session.get(url, headers={**(request_headers or {}), **headers}) as r:
+                if r.status == 304:
+                    tqdm.write(f"[#] Skipping {url} [not modified]")
+                    return file_path
+                if r.status == 416 and offset:
+                    # The partial file no longer lines up with the remote one
+                    discard_part(file_path)
+                    continue
+                if not r.ok:
+                    raise DownloadError(f"HTTP {r.status}")
+
+                resumed = r.status == 206
+                if resumed and get_range_start(r) != offset:
+                    # Appending bytes from anywhere else would corrupt the file
+                    if not offset:
+                        raise DownloadError(f"unexpected range {r.headers.get('Content-Range')!r}")
+                    tqdm.write(f"[#] Restarting {url} [range does not start at byte {offset}]")
+                    discard_part(file_path)
+                    continue
+                total_size = get_total_size(r)
+                if not resumed:
+                    # Server ignored the range or the validator changed: start over
+                    if not known and await skip_downloaded(file_path, url, total_size, r.headers, manifest):
+                        return file_path
+                    offset = 0
+                    discard_part(file_path)
+                    validator = get_resume_validator(r.headers)
+                    if validator:
+                        save_part_meta(file_path, url, validator)
+                    hasher = new_hasher(md5_hex)
+                else:
+                    tqdm.write(f"[#] Resuming {url} from byte {offset}")
+                    hasher = await asyncio.to_thread(hash_file, get_part_path(file_path), hasher=new_hasher(md5_hex))
+
+                progress = tqdm(desc=f"[+] Downloading {url}", total=total_size, initial=offset, unit="B", unit_scale=True, unit_divisor=CHUNK_SIZE, colour="MAGENTA", leave=False)
+                try:
+                    await stream_to_file(r, file_path, progress, append=resumed, keep_partial=get_part_meta_path(file_path).exists(), hasher=hasher)
+                finally:
+                    progress.close()
+                await finish_download(file_path, url, hasher, r.headers, manifest, blob_store, expected_size, md5_hex)
+                return file_path
+
+    # Segments run outside the probe's slot so each one counts against the same semaphore
+    await download_segmented(session, url, file_path, total_size, validator, semaphore, segments, request_headers)
+    if manifest is not None or blob_store is not None or expected_size is not None:
+        # Segments land out of order, so this is the one path that hashes after the fact
+        hasher = await asyncio.to_thread(hash_file, file_path, hasher=new_hasher(md5_hex))
+        await finish_download(file_path, url, hasher, response_headers, manifest, blob_store, expected_size, md5_hex)
+    return file_path
 
 def parse_4chan_thread_url(url: str) -> tuple[str, str]:
     board = re.search(r"boards\.4chan\.org/([^/]+)/thread/", url)
@@ -127,46 +319,165 @@ def parse_4chan_thread_url(url: str) -> tuple[str, str]:
 def get_4chan_media_url(board: str, tim: int, ext: str) -> str:
     return f"https://i.4cdn.org/{board}/{tim}{ext}"
 
-async def scrape_motherless_gallery(url: str, skip_images=False) -> tuple[str, list[str]]:
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
-        await page.goto(url)
-        await page.wait_for_selector('a.media-link', timeout=10000)
+def motherless_folder_name(url: str) -> str:
+    gallery_id = re.search(r"/([A-Z0-9]{6,})", url)
+    return f"motherless_{gallery_id.group(1) if gallery_id else 'gallery'}"
 
-        thumbs = await page.eval_on_selector_all('a.media-link', 'elements => elements.map(e => e.href)')
-        image_urls = []
+async def block_heavy_resources(context):
+    await context.route("**/*", block_heavy_requests)
 
-        for media_page in thumbs:
-            await page.goto(media_page)
+async def block_heavy_requests(route):
+    request = route.request
+    host = urlparse(request.url).hostname or ""
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or any(part in host for part in TRACKER_HOST_PARTS):
+        await route.abort()
+    else:
+        await route.continue_()
+
+async def resolve_motherless_media(page, media_page: str) -> str | None:
+    await page.goto(media_page, wait_until="domcontentloaded")
+    try:
+        await page.wait_for_selector("#media-media", timeout=5000)
+    except Exception:
+        return None
+    return await page.get_attribute("#media-media", "src")
+
+async def resolve_concurrently(items, resolve, workers: int, on_failed=None):
+    # Runs resolve over items with a fixed number of workers, yielding each non-empty result as it lands.
+    # Items that raise or resolve to nothing are passed to on_failed.
+    items = list(dict.fromkeys(items))
+    pending = iter(items)  # shared, so each item is resolved exactly once
+    found = asyncio.Queue()
+
+    async def work():
+        for item in pending:
             try:
-                await page.wait_for_selector("#media-media", timeout=5000)
-                src = await page.get_attribute("#media-media", "src")
-                if src and not skip_images:
-                    image_urls.append(src)
-            except:
+                result = await resolve(item)
+            except Exception:
+                result = None
+            if result:
+                await found.put(result)
+            elif on_failed:
+                on_failed(item)
+
+    tasks = [asyncio.create_task(work()) for _ in range(max(1, min(workers, len(items))))]
+    workers_done = asyncio.gather(*tasks)
+    try:
+        while True:
+            getter = asyncio.ensure_future(found.get())
+            await asyncio.wait({getter, workers_done}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield getter.result()
                 continue
+            getter.cancel()
+            while not found.empty():
+                yield found.get_nowait()
+            break
+        workers_done.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
-        await browser.close()
+async def iter_motherless_media(url: str, workers: int = MOTHERLESS_PAGE_WORKERS, media_pages=None, on_failed=None):
+    # Yields media URLs as a pool of pages resolves them, so downloads can start with the first one.
+    # Given media_pages, only those are visited and the gallery page itself is skipped.
+    # Pages come from the shared browser, so this must run on the background loop.
+    async with get_browser_service().job(setup=block_heavy_resources, user_agent=USER_AGENT) as job:
+        if media_pages is None:
+            async with job.page() as page:
+                await page.goto(url, wait_until="domcontentloaded")
+                await page.wait_for_selector("a.media-link", timeout=10000)
+                media_pages = await page.eval_on_selector_all("a.media-link", "elements => elements.map(e => e.href)")
 
-    if not image_urls:
-        return "motherless_gallery", []
+        async def resolve(media_page):
+            async with job.page() as page:
+                return await resolve_motherless_media(page, media_page)
 
-    gallery_id = re.search(r"/([A-Z0-9]{6,})", url)
-    folder_name = f"motherless_{gallery_id.group(1) if gallery_id else 'gallery'}"
-    return folder_name, image_urls
+        async for src in resolve_concurrently(media_pages, resolve, workers, on_failed):
+            yield src
+
+def parse_motherless_gallery(html: str, base_url: str) -> list[str]:
+    soup = BeautifulSoup(html, "html.parser")
+    return [urljoin(base_url, a["href"]) for a in soup.select("a.media-link[href]")]
+
+def parse_motherless_media(html: str, base_url: str) -> str | None:
+    media = BeautifulSoup(html, "html.parser").select_one("#media-media[src]")
+    return urljoin(base_url, media["src"]) if media else None
 
-async def download_file_async(session, url: str, download_path: Path):
+async def fetch_text(session, url: str) -> str:
+    async with session.get(url, headers={"User-Agent": USER_AGENT}) as response:
+        if response.status != 200:
+            raise DownloadError(f"HTTP {response.status}")
+        return await response.text()
+
+async def resolve_motherless_media_http(session, media_page: str) -> str | None:
+    return parse_motherless_media(await fetch_text(session, media_page), media_page)
+
+def read_motherless_cache(cache_path: Path, url: str, max_age: float) -> list[str] | None:
     try:
-        file_name = Path(urlparse(url).path).name
-        file_path = download_path / file_name
-
-        async with session.get(url) as response:
-            if response.status == 200:
-                async with aiofiles.open(file_path, "wb") as f:
-                    async for chunk in response.content.iter_chunked(1024):
-                        await f.write(chunk)
-            else:
-                print(f"[ERROR] Failed to download: {url}")
-    except Exception as e:
-        print(f"[ERROR] Exception downloading {url}: {e}")
\ No newline at end of file
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get("gallery") != url or time.time() - cached.get("resolved_at", 0) > max_age:
+        return None
+    return cached.get("urls") or None
+
+def write_motherless_cache(cache_path: Path, url: str, urls: list[str]):
+    tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"gallery": url, "resolved_at": time.time(), "urls": urls}, f)
+    os.replace(tmp_path, cache_path)
+
+async def iter_motherless_urls(session, url: str, cache_path: Path | None = None, on_resolved=None,
+                               max_age: float = MOTHERLESS_CACHE_TTL):
+    # Cached URLs first, then the HTTP fast path, then the browser for whatever HTTP left unresolved
+    # (or for everything, when the gallery page itself has no usable markup). on_resolved(method,
+    # count, seconds) is called for every path tried. The cache is only written once every media
+    # page has resolved, so a partial run is retried in full next time.
+    if cache_path:
+        started = time.perf_counter()
+        cached = read_motherless_cache(cache_path, url, max_age)
+        if cached:
+            for src in cached:
+                yield src
+            if on_resolved:
+                on_resolved("cache", len(cached), time.perf_counter() - started)
+            return
+
+    urls = []
+    missing = []
+    started = time.perf_counter()
+    try:
+        media_pages = parse_motherless_gallery(await fetch_text(session, url), url)
+    except Exception:
+        media_pages = []
+    if media_pages:
+        resolve = lambda media_page: resolve_motherless_media_http(session, media_page)
+        async for src in resolve_concurrently(media_pages, resolve, MOTHERLESS_HTTP_WORKERS, missing.append):
+            urls.append(src)
+            yield src
+    if on_resolved:
+        on_resolved("http", len(urls), time.perf_counter() - started)
+
+    complete = bool(media_pages) and not missing
+    if not complete:
+        started = time.perf_counter()
+        retry, missing = missing or None, []
+        found = 0
+        try:
+            async for src in iter_motherless_media(url, media_pages=retry, on_failed=missing.append):
+                found += 1
+                urls.append(src)
+                yield src
+            complete = not missing
+        except Exception:
+            # Without a browser, what HTTP resolved is still worth downloading; it just isn't cached
+            if not urls:
+                raise
+        if on_resolved:
+            on_resolved("browser", found, time.perf_counter() - started)
+
+    if cache_path and urls and complete:
+        write_motherless_cache(cache_path, url, urls)